@@ -58,6 +58,7 @@ setup(
     python_requires=">=2.7",
     install_requires=[
         "setuptools",
+        'futures; python_version < "3"',
     ],
     extras_require={
         "test": [
@@ -68,6 +69,7 @@ setup(
             "plone.testing>=5.0.0",
             "plone.app.contenttypes",
             "plone.app.robotframework[debug]",
+            "pytest",
         ],
     },
     entry_points="""
@@ -75,5 +77,7 @@ setup(
     target = plone
     [console_scripts]
     patchwatcher = collective.patchwatcher.script:run
+    [pytest11]
+    patchwatcher = collective.patchwatcher.pytest_plugin
     """,
 )
@@ -1,10 +1,26 @@
 # -*- coding: utf-8 -*-
 """Init and utils."""
+from collective.patchwatcher.functions import find_module
+from collective.patchwatcher.functions import get_fragment
+from collective.patchwatcher.functions import parse_file
+from collective.patchwatcher.functions import parse_module
+from collective.patchwatcher.functions import replace_fragment
+from collective.patchwatcher.manifest import file_changed
+from collective.patchwatcher.manifest import get_manifest
+from collective.patchwatcher.manifest import hash_data
+from collective.patchwatcher.manifest import normalize_name
+from collective.patchwatcher.process import CommandCancelled
+from collective.patchwatcher.process import CommandTimeout
+from collective.patchwatcher.process import run_command
+
+import difflib
 import glob
 import inspect
+import io
 import os
 import pkg_resources
-import subprocess
+import shutil
+import tempfile
 
 
 try:
@@ -12,8 +28,55 @@ try:
 except NameError:  # py2 compatibility
     FileNotFoundError = IOError
 
-
-class Declaration:
+# results of a check
+STATUS_LATEST = "latest"
+STATUS_UNCHANGED = "unchanged"
+STATUS_MERGED = "merged"
+STATUS_CONFLICT = "conflict"
+STATUS_MISSING = "missing"
+STATUS_ERROR = "error"
+STATUS_TIMEOUT = "timeout"
+
+
+def get_egg_locations(eggs_folder, package, path=None):
+    """Find all versions of a package in the eggs folder.
+
+    :param eggs_folder: location of the eggs folder or list of locations, earlier folders take precedence
+    :type eggs_folder: str
+    :param package: name of the package
+    :type package: str
+    :param path: path of a file relative to the distributions, distributions containing it take precedence
+    :type path: str
+    :return: mapping of versions to the locations of the distributions
+    :rtype: dict
+    """
+    if isinstance(eggs_folder, (list, tuple)):
+        locations = {}
+        for folder in reversed(eggs_folder):
+            for version, location in get_egg_locations(folder, package).items():
+                if (
+                    version not in locations
+                    or path is None
+                    or os.path.isfile(os.path.join(location, path))
+                ):
+                    locations[version] = location
+        return locations
+    glob_candidates = "{eggs_folder}/{package}*".format(
+        eggs_folder=eggs_folder, package=package
+    )
+    locations = {}
+    for candidate in glob.glob(glob_candidates):
+        basename = os.path.basename(candidate)
+        tokens = basename.split("-")
+        if len(tokens) < 2:
+            continue
+        name, version = tokens[0], tokens[1]
+        if normalize_name(name) == normalize_name(package):
+            locations[version] = candidate
+    return locations
+
+
+class Declaration(object):
     """Declaration of an overridden file."""
 
     def __init__(self, package, version, path, local_package, local_path):
@@ -49,6 +112,29 @@ class Declaration:
             raise FileNotFoundError(
                 "File to be overridden is not found: {}".format(self.current_file_path)
             )
+        # path of the vanilla file relative to the location of the distribution
+        self.distribution_path = os.path.relpath(
+            self.current_file_path, self.distribution.location
+        )
+        # outcome of the last check
+        self.status = None
+        self.conflicts = 0
+        self.conflict_version = None
+        self.changed_version = None
+        self.diffs = {}
+
+    def get_id(self):
+        """Get an identifier of the declaration, which is stable across runs.
+
+        :return: identifier
+        :rtype: str
+        """
+        return "{local_package}/{local_path}::{package}/{path}".format(
+            local_package=self.local_package,
+            local_path=os.path.normpath(self.local_path),
+            package=self.package,
+            path=os.path.normpath(self.path),
+        )
 
     def is_latest(self):
         """Checks if the latest version is reached.
@@ -58,7 +144,147 @@ class Declaration:
         """
         return self.distribution.parsed_version == self.version
 
-    def get_diff(self, path_original, path_changed, colorful=False):
+    def get_previous_location(self, eggs_folder):
+        """Get the location of the distribution at the time of the override.
+
+        :param eggs_folder: location of the eggs folder
+        :type eggs_folder: str
+        :return: location of the old distribution or None, if it is not present
+        :rtype: str
+        """
+        return get_egg_locations(
+            eggs_folder, self.package, self.distribution_path
+        ).get(str(self.version))
+
+    def has_changed(self, previous_location):
+        """Check if the vanilla file changed between the old and current version.
+
+        The hashes are taken from the manifests (``RECORD``) of both
+        distributions, if present. Otherwise the files are hashed.
+
+        :param previous_location: location of the old distribution
+        :type previous_location: str
+        :return: True, if the vanilla file changed
+        :rtype: boolean
+        """
+        return self.changed_between(previous_location, self.distribution.location)
+
+    def changed_between(self, location, other_location):
+        """Check if the vanilla file differs between two distributions (using their manifests).
+
+        :param location: location of a distribution
+        :type location: str
+        :param other_location: location of the other distribution
+        :type other_location: str
+        :return: True, if the vanilla file differs
+        :rtype: boolean
+        """
+        project_name = self.distribution.project_name
+        return file_changed(
+            get_manifest(location, project_name),
+            get_manifest(other_location, project_name),
+            self.distribution_path,
+        )
+
+    def find_changed_version(self, eggs_folder, previous_location):
+        """Find the first release, in which the vanilla file differs from the version of the override.
+
+        The versions in the eggs folder are searched with a binary search
+        comparing the hashes of the manifests, so only a logarithmic number of
+        versions is touched. A vanilla file changing back and forth may
+        therefore be blamed on a later release.
+
+        :param eggs_folder: location of the eggs folder
+        :type eggs_folder: str
+        :param previous_location: location of the distribution at the time of the override
+        :type previous_location: str
+        :return: tuple of the first changed version and the number of compared versions
+        :rtype: tuple
+        """
+        current_version = self.distribution.parsed_version
+        candidates = sorted(
+            (pkg_resources.parse_version(version), location)
+            for version, location in get_egg_locations(
+                eggs_folder, self.package, self.distribution_path
+            ).items()
+            if self.version < pkg_resources.parse_version(version) < current_version
+        ) + [(current_version, self.distribution.location)]
+        # the current version is known to differ
+        low, high = 0, len(candidates) - 1
+        compared = 0
+        while low < high:
+            middle = (low + high) // 2
+            compared += 1
+            if self.changed_between(previous_location, candidates[middle][1]):
+                high = middle
+            else:
+                low = middle + 1
+        return str(candidates[low][0]), compared
+
+    def get_local_source(self):
+        """Get the content of the override.
+
+        :return: content
+        :rtype: bytes
+        """
+        with open(self.local_file_path, "rb") as file:
+            return file.read()
+
+    def get_current_source(self):
+        """Get the content of the current vanilla file.
+
+        :return: content
+        :rtype: bytes
+        """
+        with open(self.current_file_path, "rb") as file:
+            return file.read()
+
+    def get_current_hash(self):
+        """Get the hash of the current vanilla file (taken from the manifest, if present).
+
+        :return: hash like ``sha256=...``
+        :rtype: str
+        """
+        return get_manifest(
+            self.distribution.location, self.distribution.project_name
+        ).get(self.distribution_path)
+
+    def get_local_file(self):
+        """Get the file with the override to be compared and merged.
+
+        :return: path of the file
+        :rtype: str
+        """
+        return self.local_file_path
+
+    def get_current_file(self):
+        """Get the current vanilla file to be compared and merged.
+
+        :return: path of the file
+        :rtype: str
+        """
+        return self.current_file_path
+
+    def get_previous_file(self, previous_location):
+        """Get the old vanilla file to be compared and merged.
+
+        :param previous_location: location of the old distribution
+        :type previous_location: str
+        :return: path of the file
+        :rtype: str
+        """
+        return os.path.normpath(os.path.join(previous_location, self.distribution_path))
+
+    def write_merge_result(self, merge_result):
+        """Write the merge result into the override.
+
+        :param merge_result: merge result
+        :type merge_result: str
+        """
+        with open(self.local_file_path, "wb") as file:
+            file.write(merge_result.encode("utf8"))
+
+    def get_diff(self, path_original, path_changed, colorful=False, limits=None):
         """Perform a diff between two files. This is done by calling `diff`.
 
         :param path_original: path of original file
@@ -67,33 +293,31 @@ class Declaration:
         :type path_changed: str
         :param colorful: colorful output
         :type colorful: boolean
+        :param limits: time budget and resource limits for diff
+        :type limits: collective.patchwatcher.process.Limits
+        :raises CommandTimeout: Thrown when the time budget is exhausted.
         :return: tuple of diff's output and return code
         :rtype: tuple
         """
         path_original = os.path.normpath(path_original)
         path_changed = os.path.normpath(path_changed)
 
+        args = ["diff", "-p"]
+        if colorful:
+            args.append("--color=always")
         try:
-            p = subprocess.Popen(
-                [
-                    "diff",
-                    "--color=always" if colorful else "" "-p",
-                    path_original,
-                    path_changed,
-                ],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
+            diff_output, err, rc = run_command(
+                args + [path_original, path_changed], limits
             )
-            diff_output, _err = p.communicate()
-            diff_output = diff_output.decode("utf8")
-            rc = p.returncode
+            diff_output = (diff_output if rc in (0, 1) else err).decode("utf8")
+        except CommandTimeout:
+            raise
         except Exception as e:
             diff_output = repr(e)
             rc = 2
         return diff_output, rc
 
-    def merge_three_way(self, myfile, oldfile, yourfile):
+    def merge_three_way(self, myfile, oldfile, yourfile, limits=None):
         """Perform a three-way merge using diff3.
 
         :param myfile: my file
@@ -102,25 +326,60 @@ class Declaration:
         :type oldfile: str
         :param yourfile: your file
         :type yourfile: str
+        :param limits: time budget and resource limits for diff3
+        :type limits: collective.patchwatcher.process.Limits
+        :raises CommandTimeout: Thrown when the time budget is exhausted.
         :return: tuple of merged result and return code
         :rtype: tuple
         """
         try:
-            p = subprocess.Popen(
-                ["diff3", "-m", myfile, oldfile, yourfile],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
+            merge_result, err, rc = run_command(
+                ["diff3", "-m", myfile, oldfile, yourfile], limits
             )
-            merge_result, _err = p.communicate()
-            merge_result = merge_result.decode("utf8")
-            rc = p.returncode
+            merge_result = (merge_result if rc in (0, 1) else err).decode("utf8")
+        except CommandTimeout:
+            raise
         except Exception as e:
             merge_result = repr(e)
             rc = 2
         return merge_result, rc
 
-    def check(self, logger, eggs_folder, write, diff_options=None):
+    def get_merge_diff(self, local_file_path, merge_lines):
+        """Get the diff between the override and the merge result.
+
+        The diff is computed in Python and may be slow for huge files, so it
+        is only computed, if somebody receives it.
+
+        :param local_file_path: path of the file with the override
+        :type local_file_path: str
+        :param merge_lines: lines of the merge result
+        :type merge_lines: list
+        :return: unified diff
+        :rtype: str
+        """
+        with open(local_file_path, "rb") as file:
+            local_lines = file.read().decode("utf8").splitlines(True)
+        return "".join(
+            difflib.unified_diff(
+                local_lines,
+                merge_lines,
+                fromfile=self.local_file_path,
+                tofile="merge result",
+            )
+        )
+
+    def check(
+        self,
+        logger,
+        eggs_folder,
+        write,
+        diff_options=None,
+        reporter=None,
+        limits=None,
+        old_current_diff=None,
+        chain=None,
+        blame=False,
+    ):
         """This method checks three files:
 
         1) the old vanilla file (found in the eggs folder)
@@ -140,17 +399,72 @@ class Declaration:
         :type write: boolean
         :param diff_options: some options to show diffs for inspection reasons
         :type diff_options: dict
+        :param reporter: receives the declaration with its status and diffs after the check (e.g. a report)
+        :type reporter: object
+        :param limits: time budget and resource limits for the external tools
+        :type limits: collective.patchwatcher.process.Limits
+        :param old_current_diff: precomputed diff between the old and current vanilla file (see collective.patchwatcher.batch)
+        :type old_current_diff: tuple
+        :param chain: merge the changes release by release instead of a single three-way merge
+        :type chain: collective.patchwatcher.chain.MergeChain
+        :param blame: find the first release, in which the vanilla file changed
+        :type blame: boolean
         :return: True, if no changes were found or changes were merged without any conflict.
         :rtype: boolean
         """
-        diff_options = diff_options or {}
-
+        self.status = None
+        self.conflicts = 0
+        self.conflict_version = None
+        self.changed_version = None
+        self.diffs = {}
+        try:
+            ok = self._check(
+                logger,
+                eggs_folder,
+                write,
+                diff_options or {},
+                limits,
+                old_current_diff,
+                chain,
+                blame,
+                reporter is not None,
+            )
+        except CommandCancelled:
+            raise
+        except CommandTimeout as e:
+            logger.error(
+                "Timeout while checking the override {file} in package {package}: {error}".format(
+                    file=self.path, package=self.package, error=e
+                )
+            )
+            self.status = STATUS_TIMEOUT
+            ok = False
+        if reporter is not None:
+            reporter.add(self)
+        # the diffs may be huge, so do not keep them around
+        self.diffs = {}
+        return ok
+
+    def _check(
+        self,
+        logger,
+        eggs_folder,
+        write,
+        diff_options,
+        limits,
+        old_current_diff=None,
+        chain=None,
+        blame=False,
+        merge_diff=False,
+    ):
         if diff_options.get("customized_current"):
             diff_output, rc = self.get_diff(
-                path_original=self.current_file_path,
-                path_changed=self.local_file_path,
+                path_original=self.get_current_file(),
+                path_changed=self.get_local_file(),
                 colorful=True,
+                limits=limits,
             )
+            self.diffs["customized_current"] = diff_output
             logger.info(
                 u"Result of performing diff between:\n* overridden file: {local_file}\n* original file: {current_file}\n\n {diff_output}".format(
                     local_file=self.local_file_path,
@@ -167,6 +481,7 @@ class Declaration:
                     version=str(self.version),
                 )
             )
+            self.status = STATUS_LATEST
             return True
         logger.info(
             "The override {file} in package {package} is based on version {version}. Currently installed version is {current_version}. Checking for changes.".format(
@@ -176,45 +491,52 @@ class Declaration:
                 current_version=self.distribution.version,
             )
         )
-        # Look out for old original version
-        # egg folder
-        glob_candidates = "{eggs_folder}/{package}*".format(
-            eggs_folder=eggs_folder, package=self.package
-        )
-
-        # Search for previous versions in eggs
-        for candidate in glob.glob(glob_candidates):
-            basename = os.path.basename(candidate)
-            tokens = basename.split("-")
-            _name, version = tokens[0], tokens[1]
-            if version == str(self.version):
-                break
-        else:
+        # Look out for old original version in the eggs folder
+        previous_location = self.get_previous_location(eggs_folder)
+        if not previous_location:
             logger.error(
                 "Did not find version {version} of package {package}".format(
                     version=self.version, package=self.package
                 )
             )
+            self.status = STATUS_MISSING
             return False
-
-        # Replace versions in path
-        candidate = pkg_resources.resource_filename(
-            self.distribution.project_name, ""
-        ).replace(str(self.distribution.parsed_version), str(self.version))
-        previous_file_path = os.path.normpath(os.path.join(candidate, self.path))
+        # the manifests tell us about unchanged files without reading them
+        if not self.has_changed(previous_location):
+            logger.info("No changes found. Nothing to do!")
+            self.status = STATUS_UNCHANGED
+            return True
+        previous_file_path = self.get_previous_file(previous_location)
+        current_file_path = self.get_current_file()
+        local_file_path = self.get_local_file()
 
         # check if there are changed between the original versions
-        diff_output, rc = self.get_diff(
-            path_original=previous_file_path,
-            path_changed=self.current_file_path,
-            colorful=True,
-        )
+        if old_current_diff is None:
+            diff_output, rc = self.get_diff(
+                path_original=previous_file_path,
+                path_changed=current_file_path,
+                colorful=True,
+                limits=limits,
+            )
+        else:
+            diff_output, rc = old_current_diff
 
         if rc == 0:  # no changes
             logger.info("No changes found. Nothing to do!")
+            self.status = STATUS_UNCHANGED
             return True
         elif rc == 1:  # changes
             logger.info("Found some changes!")
+            self.diffs["old_current"] = diff_output
+            if blame:
+                self.changed_version, compared = self.find_changed_version(
+                    eggs_folder, previous_location
+                )
+                logger.info(
+                    "The vanilla file {file} changed first in version {version} (compared {compared} versions).".format(
+                        file=self.path, version=self.changed_version, compared=compared
+                    )
+                )
             if diff_options.get("old_current"):
                 logger.info(
                     u"Result of performing diff between:\n* old file: {previous_file_path}\n* current file: {current_file}\n\n {diff_output}".format(
@@ -226,25 +548,69 @@ class Declaration:
         else:  # process exited with error
             logger.error("Error while performing diff!")
             logger.error(diff_output)
+            self.status = STATUS_ERROR
             return False
 
-        merge_result, rc = self.merge_three_way(
-            myfile=self.local_file_path,
-            oldfile=previous_file_path,
-            yourfile=self.current_file_path,
+        if chain is not None:
+            merge_result, rc, self.conflict_version = chain.merge(
+                self, eggs_folder, previous_location, limits
+            )
+        else:
+            merge_result, rc = self.merge_three_way(
+                myfile=local_file_path,
+                oldfile=previous_file_path,
+                yourfile=current_file_path,
+                limits=limits,
+            )
+        return self._apply_merge_result(
+            logger, merge_result, rc, local_file_path, write, merge_diff
         )
+
+    def _apply_merge_result(
+        self, logger, merge_result, rc, local_file_path, write, merge_diff
+    ):
+        """Record the outcome of the merge in the declaration and write the merge result, if wished.
+
+        :param logger: logger
+        :type logger: object
+        :param merge_result: merge result
+        :type merge_result: str
+        :param rc: return code of the merge (like diff3)
+        :type rc: int
+        :param local_file_path: path of the file with the override, which was merged
+        :type local_file_path: str
+        :param write: True if the merge result should be written to the override file (even with conflicts)
+        :type write: boolean
+        :param merge_diff: compute the diff between the override and the merge result
+        :type merge_diff: boolean
+        :return: True, if the merge succeeded without any conflict.
+        :rtype: boolean
+        """
         if rc == 0:  # no changes
             logger.info("Three-way merge was successful!")
         if rc == 2:
             logger.error("Error while merging three-way!")
             logger.error(merge_result)
+            self.status = STATUS_ERROR
             return False
         ret = not bool(rc)
+        self.status = STATUS_CONFLICT if rc == 1 else STATUS_MERGED
+        merge_lines = merge_result.splitlines(True)
+        self.conflicts = len(
+            [line for line in merge_lines if line.startswith("<<<<<<< ")]
+        )
+        if merge_diff:
+            self.diffs["merge"] = self.get_merge_diff(local_file_path, merge_lines)
         if rc == 1:
-            logger.warn("Conflicts detected! Please fix them on your own!")
+            logger.warning("Conflicts detected! Please fix them on your own!")
+            if self.conflict_version:
+                logger.warning(
+                    "The conflicts are caused by version {version} of package {package}. The merge stopped there.".format(
+                        version=self.conflict_version, package=self.package
+                    )
+                )
         if write and rc in (0, 1):
-            with open(self.local_file_path, "wb") as file:
-                file.write(merge_result)
+            self.write_merge_result(merge_result)
             if rc == 1:
                 logger.info(
                     "Changes (with conflicts) written into {}".format(
@@ -258,6 +624,244 @@ class Declaration:
         return ret
 
 
+class FunctionDeclaration(Declaration):
+    """Declaration of a patched function or class (e.g. a monkeypatch).
+
+    Only the source of the function or class is compared and merged, so
+    changes elsewhere in the vanilla module are ignored.
+    """
+
+    def __init__(self, package, version, name, local_package, local_path, local_name=None):
+        """A declaration of a patched function or class.
+
+        :param package: package of the vanilla function
+        :type package: str
+        :param version: version at the time of the patch
+        :type version: str
+        :param name: dotted name of the vanilla function, class or method (e.g. ``plone.app.foo.views.View.render``)
+        :type name: str
+        :param local_package: own package where the patch lives
+        :type local_package: str
+        :param local_path: relative path within the own package of the module with the patch
+        :type local_path: str
+        :param local_name: qualified name of the patch within the local module, defaults to the last part of name
+        :type local_name: str
+        :raises LookupError: Thrown when the module of the function could not be found.
+        """
+        distribution = pkg_resources.get_distribution(package)
+        module_path, self.qualname = find_module(distribution.location, name)
+        path = os.path.relpath(
+            os.path.join(distribution.location, module_path),
+            pkg_resources.resource_filename(distribution.project_name, ""),
+        )
+        Declaration.__init__(self, package, version, path, local_package, local_path)
+        self.name = name
+        self.local_name = local_name or name.split(".")[-1]
+        self._tempdir = None
+
+    def get_id(self):
+        """Get an identifier of the declaration, which is stable across runs.
+
+        :return: identifier
+        :rtype: str
+        """
+        return "{local_package}/{local_path}:{local_name}::{name}".format(
+            local_package=self.local_package,
+            local_path=os.path.normpath(self.local_path),
+            local_name=self.local_name,
+            name=self.name,
+        )
+
+    def extract_fragment(self, lines, tree, qualname, filename):
+        """Extract the source of a function or class from a parsed module.
+
+        :param lines: lines of the module
+        :type lines: list
+        :param tree: syntax tree of the module
+        :type tree: ast.Module
+        :param qualname: qualified name of the function or class within the module
+        :type qualname: str
+        :param filename: path of the module (for the error message)
+        :type filename: str
+        :raises LookupError: Thrown when the function or class could not be found.
+        :return: source of the function or class
+        :rtype: str
+        """
+        fragment = get_fragment(lines, tree, qualname)
+        if fragment is None:
+            raise LookupError(
+                "Did not find {qualname} in {filename}".format(
+                    qualname=qualname, filename=filename
+                )
+            )
+        return fragment
+
+    def get_local_fragment(self):
+        """Get the source of the patch.
+
+        :return: source
+        :rtype: str
+        """
+        lines, tree = parse_file(self.local_file_path)
+        return self.extract_fragment(lines, tree, self.local_name, self.local_file_path)
+
+    def get_current_fragment(self):
+        """Get the source of the latest vanilla function.
+
+        :return: source
+        :rtype: str
+        """
+        lines, tree = parse_module(
+            self.distribution.project_name, self.distribution.version, self.current_file_path
+        )
+        return self.extract_fragment(lines, tree, self.qualname, self.current_file_path)
+
+    def get_previous_fragment(self, previous_location):
+        """Get the source of the old vanilla function.
+
+        :param previous_location: location of the old distribution
+        :type previous_location: str
+        :return: source
+        :rtype: str
+        """
+        path = Declaration.get_previous_file(self, previous_location)
+        lines, tree = parse_module(self.distribution.project_name, self.version, path)
+        return self.extract_fragment(lines, tree, self.qualname, path)
+
+    def get_local_source(self):
+        """Get the source of the patch.
+
+        :return: source
+        :rtype: bytes
+        """
+        return self.get_local_fragment().encode("utf8")
+
+    def get_current_source(self):
+        """Get the source of the latest vanilla function.
+
+        :return: source
+        :rtype: bytes
+        """
+        return self.get_current_fragment().encode("utf8")
+
+    def get_current_hash(self):
+        """Get the hash of the latest vanilla function.
+
+        :return: hash like ``sha256=...``
+        :rtype: str
+        """
+        return hash_data(self.get_current_source())
+
+    def changed_between(self, location, other_location):
+        """Check if the vanilla function differs between two distributions.
+
+        :param location: location of a distribution
+        :type location: str
+        :param other_location: location of the other distribution
+        :type other_location: str
+        :return: True, if the vanilla function differs
+        :rtype: boolean
+        """
+        # the module is the same, so is the function
+        if not Declaration.changed_between(self, location, other_location):
+            return False
+        return self.get_previous_fragment(location) != self.get_previous_fragment(
+            other_location
+        )
+
+    def write_fragment(self, filename, fragment):
+        """Write the source of a function into the temporary directory of the check.
+
+        :param filename: name of the file
+        :type filename: str
+        :param fragment: source of the function
+        :type fragment: str
+        :return: path of the file
+        :rtype: str
+        """
+        path = os.path.join(self._tempdir, filename)
+        with io.open(path, "w", encoding="utf8") as file:
+            file.write(fragment)
+        return path
+
+    def get_local_file(self):
+        """Get a file with the patch to be compared and merged.
+
+        :return: path of the file
+        :rtype: str
+        """
+        return self.write_fragment("local.py", self.get_local_fragment())
+
+    def get_current_file(self):
+        """Get a file with the latest vanilla function to be compared and merged.
+
+        :return: path of the file
+        :rtype: str
+        """
+        return self.write_fragment("current.py", self.get_current_fragment())
+
+    def get_previous_file(self, previous_location):
+        """Get a file with the old vanilla function to be compared and merged.
+
+        :param previous_location: location of the old distribution
+        :type previous_location: str
+        :return: path of the file
+        :rtype: str
+        """
+        return self.write_fragment(
+            "previous-{}.py".format(os.path.basename(previous_location)),
+            self.get_previous_fragment(previous_location),
+        )
+
+    def write_merge_result(self, merge_result):
+        """Replace the patch in its module with the merge result.
+
+        :param merge_result: merged source of the function
+        :type merge_result: str
+        """
+        lines, tree = parse_file(self.local_file_path)
+        source = replace_fragment(lines, tree, self.local_name, merge_result)
+        with open(self.local_file_path, "wb") as file:
+            file.write(source.encode("utf8"))
+
+    def _check(
+        self,
+        logger,
+        eggs_folder,
+        write,
+        diff_options,
+        limits,
+        old_current_diff=None,
+        chain=None,
+        blame=False,
+        merge_diff=False,
+    ):
+        """Check the declaration (see Declaration.check) using temporary files with the sources of the functions."""
+        self._tempdir = tempfile.mkdtemp(prefix="patchwatcher-")
+        try:
+            return Declaration._check(
+                self,
+                logger,
+                eggs_folder,
+                write,
+                diff_options,
+                limits,
+                old_current_diff,
+                chain,
+                blame,
+                merge_diff,
+            )
+        except (LookupError, SyntaxError) as e:
+            logger.error(
+                "Error while extracting {name}: {error}".format(name=self.name, error=e)
+            )
+            self.status = STATUS_ERROR
+            return False
+        finally:
+            shutil.rmtree(self._tempdir)
+            self._tempdir = None
+
+
 class DeclarationCollection(list):
     """Declarations of overridden files."""
 
@@ -295,3 +899,28 @@ class DeclarationCollection(list):
                 local_path=local_path,
             )
         )
+
+    def add_function(self, package, version, name, local_path, local_name=None):
+        """Method to add a declaration of a patched function or class to the collection
+
+        :param package: package of the vanilla function
+        :type package: str
+        :param version: version at the time of the patch
+        :type version: str
+        :param name: dotted name of the vanilla function, class or method
+        :type name: str
+        :param local_path: relative path within the own package of the module with the patch
+        :type local_path: str
+        :param local_name: qualified name of the patch within the local module, defaults to the last part of name
+        :type local_name: str
+        """
+        self.append(
+            FunctionDeclaration(
+                package=package,
+                version=version,
+                name=name,
+                local_package=self.local_package,
+                local_path=local_path,
+                local_name=local_name,
+            )
+        )
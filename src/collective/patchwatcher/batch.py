@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""Batched diffs: one call of ``diff -r`` per pair of distributions.
+
+The declarations are grouped by project, old version and current version.
+For every group a temporary tree with hard links to the declared old and
+current vanilla files is created and compared with a single recursive diff.
+The output is then split into the results of the single declarations.
+"""
+from collective.patchwatcher import FunctionDeclaration
+from collective.patchwatcher.manifest import changed_files
+from collective.patchwatcher.manifest import get_manifest
+from collective.patchwatcher.manifest import normalize_path
+from collective.patchwatcher.process import CommandTimeout
+from collective.patchwatcher.process import run_command
+
+import os
+import shutil
+import tempfile
+
+
+def group_declarations(declarations):
+    """Group the declarations by project, old version and current version.
+
+    :param declarations: declarations
+    :type declarations: list
+    :return: mapping of (project, old version, current version) to lists of declarations
+    :rtype: dict
+    """
+    groups = {}
+    for declaration in declarations:
+        key = (
+            declaration.distribution.project_name,
+            str(declaration.version),
+            str(declaration.distribution.version),
+        )
+        groups.setdefault(key, []).append(declaration)
+    return groups
+
+
+def link(source, destination):
+    """Hard link a file (or copy it, if hard links are not possible)."""
+    directory = os.path.dirname(destination)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    try:
+        os.link(source, destination)
+    except (OSError, AttributeError):
+        shutil.copy2(source, destination)
+
+
+def quote_path(path):
+    """Quote a path like GNU diff does for paths with special characters (e.g. spaces).
+
+    :param path: path
+    :type path: str
+    :return: quoted path
+    :rtype: str
+    """
+    escaped = path.replace("\\", "\\\\").replace('"', '\\"')
+    return '"{}"'.format(escaped.replace("\t", "\\t").replace("\n", "\\n"))
+
+
+def split_diff(output, paths):
+    """Split the output of ``diff -r`` into the diffs of the single files.
+
+    :param output: output of ``diff -r`` on the trees ``a`` and ``b``
+    :type output: str
+    :param paths: compared relative paths
+    :type paths: list
+    :return: mapping of paths to their diffs (unchanged paths are omitted)
+    :rtype: dict
+    """
+    headers = {}
+    for path in paths:
+        headers[" a/{path} b/{path}".format(path=path)] = path
+        headers[
+            " {} {}".format(quote_path("a/" + path), quote_path("b/" + path))
+        ] = path
+    diffs = {}
+    current = None
+    for line in output.splitlines(True):
+        if line.startswith("diff "):
+            header = line.rstrip("\n")
+            # the options come first and never contain the compared trees
+            starts = [
+                index
+                for index in (header.find(" a/"), header.find(' "a/'))
+                if index >= 0
+            ]
+            current = headers.get(header[min(starts):]) if starts else None
+            if current is not None:
+                diffs[current] = []
+            continue
+        if current is not None:
+            diffs[current].append(line)
+    return {path: "".join(lines) for path, lines in diffs.items()}
+
+
+def diff_group(declarations, previous_location, colorful=False, limits=None):
+    """Compare the old and current vanilla files of a group with a single ``diff -r``.
+
+    :param declarations: declarations of the same project and versions
+    :type declarations: list
+    :param previous_location: location of the old distribution
+    :type previous_location: str
+    :param colorful: colorful output
+    :type colorful: boolean
+    :param limits: time budget and resource limits for diff
+    :type limits: collective.patchwatcher.process.Limits
+    :raises CommandTimeout: Thrown when the time budget is exhausted.
+    :return: mapping of declarations to tuples of diff's output and return code, declarations without an attributed diff are omitted
+    :rtype: dict
+    """
+    tempdir = tempfile.mkdtemp(prefix="patchwatcher-")
+    try:
+        paths = {}
+        for declaration in declarations:
+            path = declaration.distribution_path.replace(os.sep, "/")
+            previous_file_path = declaration.get_previous_file(previous_location)
+            if not os.path.isfile(previous_file_path):
+                continue
+            if path not in paths:
+                link(previous_file_path, os.path.join(tempdir, "a", path))
+                link(declaration.current_file_path, os.path.join(tempdir, "b", path))
+            paths.setdefault(path, []).append(declaration)
+        if not paths:
+            return {}
+        args = ["diff", "-r", "-p"]
+        if colorful:
+            args.append("--color=always")
+        output, _err, rc = run_command(args + ["a", "b"], limits, cwd=tempdir)
+        if rc not in (0, 1):
+            return {}
+        diffs = split_diff(output.decode("utf8"), list(paths))
+    finally:
+        shutil.rmtree(tempdir)
+    results = {}
+    # only changed files are compared, so files without a diff could not be
+    # attributed and are left to the diff of the single declaration
+    for path, path_declarations in paths.items():
+        if path in diffs:
+            for declaration in path_declarations:
+                results[declaration] = (diffs[path], 1)
+    return results
+
+
+def batch_diff(declarations, eggs_folder, logger, colorful=False, limits=None):
+    """Compare the old and current vanilla files of all declarations with one ``diff -r`` per pair of distributions.
+
+    Declarations of functions, declarations without changes according to
+    the manifests and declarations whose diff could not be determined are
+    omitted from the result and have to be compared on their own.
+
+    :param declarations: declarations
+    :type declarations: list
+    :param eggs_folder: location of the eggs folder
+    :type eggs_folder: str
+    :param logger: logger
+    :type logger: object
+    :param colorful: colorful output
+    :type colorful: boolean
+    :param limits: time budget and resource limits for diff
+    :type limits: collective.patchwatcher.process.Limits
+    :return: mapping of declarations to tuples of diff's output and return code
+    :rtype: dict
+    """
+    results = {}
+    for key, group in sorted(group_declarations(declarations).items()):
+        group = [
+            declaration
+            for declaration in group
+            if not isinstance(declaration, FunctionDeclaration)
+            and not declaration.is_latest()
+        ]
+        previous_location = group and group[0].get_previous_location(eggs_folder)
+        if not previous_location:
+            continue
+        # the manifests tell us about the unchanged files of the group in one pass
+        project_name = group[0].distribution.project_name
+        changed = set(
+            changed_files(
+                get_manifest(previous_location, project_name),
+                get_manifest(group[0].distribution.location, project_name),
+                [declaration.distribution_path for declaration in group],
+            )
+        )
+        group = [
+            declaration
+            for declaration in group
+            if normalize_path(declaration.distribution_path) in changed
+        ]
+        try:
+            results.update(diff_group(group, previous_location, colorful, limits))
+        except CommandTimeout as e:
+            logger.error(
+                "Timeout while comparing {} {} and {}: {}".format(
+                    key[0], key[1], key[2], e
+                )
+            )
+    return results
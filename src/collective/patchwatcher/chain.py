@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""Chained merges: applying the upstream changes release by release.
+
+Merging a jump over several releases in a single three-way merge often
+produces large conflicts, which would not happen when the changes are
+applied one release after the other. The chain uses all versions of a
+package present in the eggs folder, skips the releases which did not touch
+the vanilla file (or do not contain it) and stops at the first release
+causing a conflict.
+
+The intermediate merge results are memoized by the hashes of their inputs,
+so repeated runs and other overrides of the same vanilla file reuse them.
+"""
+from collective.patchwatcher import get_egg_locations
+from collective.patchwatcher.manifest import hash_data
+from collective.patchwatcher.manifest import hash_file
+
+import io
+import json
+import os
+import pkg_resources
+import shutil
+import tempfile
+import threading
+
+
+class MergeChain(object):
+    """Chained merges with memoized intermediate results."""
+
+    def __init__(self, cache_folder=None):
+        """Initialize the chain.
+
+        :param cache_folder: folder for persisting the merge results, only kept in memory if omitted
+        :type cache_folder: str
+        """
+        self.cache_folder = cache_folder
+        self.cache = {}
+        self.lock = threading.Lock()
+        if cache_folder and not os.path.isdir(cache_folder):
+            os.makedirs(cache_folder)
+
+    def get(self, key):
+        """Get a memoized merge result.
+
+        :param key: hash of the inputs of the merge
+        :type key: str
+        :return: tuple of merge result and return code or None
+        :rtype: tuple
+        """
+        with self.lock:
+            if key in self.cache:
+                return self.cache[key]
+        if not self.cache_folder:
+            return None
+        try:
+            with io.open(self.get_path(key), encoding="utf8") as file:
+                data = json.load(file)
+        except (IOError, OSError, ValueError):
+            return None
+        result = self.cache[key] = (data["result"], data["rc"])
+        return result
+
+    def set(self, key, merge_result, rc):
+        """Memoize a merge result.
+
+        :param key: hash of the inputs of the merge
+        :type key: str
+        :param merge_result: merge result
+        :type merge_result: str
+        :param rc: return code of the merge
+        :type rc: int
+        """
+        with self.lock:
+            self.cache[key] = (merge_result, rc)
+        if not self.cache_folder:
+            return
+        fd, path = tempfile.mkstemp(dir=self.cache_folder)
+        with io.open(fd, "wb") as file:
+            # json.dumps returns bytes on py2 and text on py3
+            file.write(json.dumps({"result": merge_result, "rc": rc}).encode("utf8"))
+        getattr(os, "replace", os.rename)(path, self.get_path(key))
+
+    def get_path(self, key):
+        return os.path.join(self.cache_folder, key.split("=", 1)[1] + ".json")
+
+    def get_steps(self, declaration, eggs_folder, previous_location):
+        """Get the versions from the declared version up to the current version.
+
+        :return: list of tuples of version and location of the distribution
+        :rtype: list
+        """
+        current_version = declaration.distribution.parsed_version
+        versions = sorted(
+            (pkg_resources.parse_version(version), location)
+            for version, location in get_egg_locations(
+                eggs_folder, declaration.package, declaration.distribution_path
+            ).items()
+            if declaration.version
+            < pkg_resources.parse_version(version)
+            < current_version
+        )
+        return (
+            [(declaration.version, previous_location)]
+            + versions
+            + [(current_version, declaration.distribution.location)]
+        )
+
+    def merge(self, declaration, eggs_folder, previous_location, limits=None):
+        """Merge the upstream changes into the override release by release.
+
+        :param declaration: declaration
+        :type declaration: collective.patchwatcher.Declaration
+        :param eggs_folder: location of the eggs folder
+        :type eggs_folder: str
+        :param previous_location: location of the distribution at the time of the override
+        :type previous_location: str
+        :param limits: time budget and resource limits for diff3
+        :type limits: collective.patchwatcher.process.Limits
+        :return: tuple of merge result, return code (like diff3) and the version causing the conflicts
+        :rtype: tuple
+        """
+        steps = self.get_steps(declaration, eggs_folder, previous_location)
+        with open(declaration.get_local_file(), "rb") as file:
+            state = file.read().decode("utf8")
+        tempdir = tempfile.mkdtemp(prefix="patchwatcher-")
+        try:
+            location = previous_location
+            for version, next_location in steps[1:]:
+                try:
+                    if not declaration.changed_between(location, next_location):
+                        continue
+                    old_file = declaration.get_previous_file(location)
+                    new_file = declaration.get_previous_file(next_location)
+                except (IOError, OSError, LookupError, SyntaxError):
+                    # the release does not have the vanilla file (or function)
+                    continue
+                if not os.path.isfile(new_file):
+                    continue
+                location = next_location
+                key = hash_data(
+                    (
+                        hash_data(state.encode("utf8"))
+                        + hash_file(old_file)
+                        + hash_file(new_file)
+                    ).encode("ascii")
+                )
+                cached = self.get(key)
+                if cached is None:
+                    state_file = os.path.join(tempdir, "state")
+                    with open(state_file, "wb") as file:
+                        file.write(state.encode("utf8"))
+                    merge_result, rc = declaration.merge_three_way(
+                        myfile=state_file,
+                        oldfile=old_file,
+                        yourfile=new_file,
+                        limits=limits,
+                    )
+                    if rc in (0, 1):
+                        self.set(key, merge_result, rc)
+                else:
+                    merge_result, rc = cached
+                if rc == 2:
+                    return merge_result, rc, None
+                state = merge_result
+                if rc == 1:
+                    return state, rc, str(version)
+        finally:
+            shutil.rmtree(tempdir)
+        return state, 0, None
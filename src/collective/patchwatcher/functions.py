@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""Extracting the source of single functions and classes from Python modules.
+
+The modules are parsed with ``ast`` and never imported, so any version of a
+module can be inspected regardless of the installed dependencies.
+"""
+import ast
+import io
+import os
+import re
+import textwrap
+import threading
+
+
+_modules = {}
+_lock = threading.Lock()
+
+
+def find_module(location, dotted_name):
+    """Find the module of a dotted name like ``plone.app.foo.views.View.render``.
+
+    :param location: location of the distribution
+    :type location: str
+    :param dotted_name: dotted name of a function, class or method
+    :type dotted_name: str
+    :return: tuple of the module path (relative to the location) and the qualified name within the module
+    :rtype: tuple
+    """
+    parts = dotted_name.split(".")
+    for index in range(len(parts) - 1, 0, -1):
+        module_path = os.path.join(*parts[:index])
+        for candidate in (
+            module_path + ".py",
+            os.path.join(module_path, "__init__.py"),
+        ):
+            if os.path.isfile(os.path.join(location, candidate)):
+                return candidate, ".".join(parts[index:])
+    raise LookupError("Did not find a module for {}".format(dotted_name))
+
+
+def parse_file(path):
+    """Parse a Python file.
+
+    :param path: path of the file
+    :type path: str
+    :return: tuple of the lines of the source and the syntax tree
+    :rtype: tuple
+    """
+    with io.open(path, encoding="utf8") as file:
+        source = file.read()
+    return source.splitlines(True), ast.parse(source, path)
+
+
+def parse_module(project_name, version, path):
+    """Parse a module of a distribution (cached per project and version).
+
+    :param project_name: name of the project
+    :type project_name: str
+    :param version: version of the distribution
+    :type version: str
+    :param path: path of the module
+    :type path: str
+    :return: tuple of the lines of the source and the syntax tree
+    :rtype: tuple
+    """
+    key = (project_name, str(version), os.path.normpath(path))
+    with _lock:
+        if key not in _modules:
+            _modules[key] = parse_file(path)
+        return _modules[key]
+
+
+def find_node(tree, qualname):
+    """Find the definition of a function or class within a module.
+
+    :param tree: syntax tree of the module
+    :type tree: ast.Module
+    :param qualname: qualified name like ``View.render``
+    :type qualname: str
+    :return: node of the definition or None
+    :rtype: ast.AST
+    """
+    node = tree
+    for name in qualname.split("."):
+        for child in getattr(node, "body", []):
+            if (
+                isinstance(child, (ast.FunctionDef, ast.ClassDef))
+                or type(child).__name__ == "AsyncFunctionDef"
+            ) and child.name == name:
+                node = child
+                break
+        else:
+            return None
+    return node
+
+
+def get_line_range(lines, node):
+    """Get the lines of a definition including its decorators.
+
+    :param lines: lines of the module
+    :type lines: list
+    :param node: node of the definition
+    :type node: ast.AST
+    :return: tuple of the first (inclusive) and last (exclusive) index of the lines
+    :rtype: tuple
+    """
+    start = min([node.lineno] + [d.lineno for d in node.decorator_list]) - 1
+    end = getattr(node, "end_lineno", None)
+    if end is None:  # before Python 3.8: the block ends with the indentation
+        # the line number of a decorated definition is the one of its first
+        # decorator, so the definition follows the (multi-line) decorators
+        first = max([node.lineno] + [d.lineno for d in node.decorator_list]) - 1
+        pattern = re.compile(r"\s*(async\s+)?(def|class)\s+{}\b".format(node.name))
+        while first < len(lines) - 1 and not pattern.match(lines[first]):
+            first += 1
+        indentation = len(lines[first]) - len(lines[first].lstrip())
+        end = first + 1
+        for index in range(first + 1, len(lines)):
+            line = lines[index]
+            if line.strip() and len(line) - len(line.lstrip()) <= indentation:
+                break
+            if line.strip():
+                end = index + 1
+    return start, end
+
+
+def get_fragment(lines, tree, qualname):
+    """Get the dedented source of a function or class.
+
+    :param lines: lines of the module
+    :type lines: list
+    :param tree: syntax tree of the module
+    :type tree: ast.Module
+    :param qualname: qualified name like ``View.render``
+    :type qualname: str
+    :return: source of the definition or None, if it does not exist
+    :rtype: str
+    """
+    node = find_node(tree, qualname)
+    if node is None:
+        return None
+    start, end = get_line_range(lines, node)
+    fragment = textwrap.dedent("".join(lines[start:end]))
+    if not fragment.endswith("\n"):
+        fragment += "\n"
+    return fragment
+
+
+def replace_fragment(lines, tree, qualname, fragment):
+    """Replace the source of a function or class within a module.
+
+    :param lines: lines of the module
+    :type lines: list
+    :param tree: syntax tree of the module
+    :type tree: ast.Module
+    :param qualname: qualified name like ``View.render``
+    :type qualname: str
+    :param fragment: new dedented source of the definition
+    :type fragment: str
+    :return: new source of the module
+    :rtype: str
+    """
+    node = find_node(tree, qualname)
+    if node is None:
+        raise LookupError("Did not find {}".format(qualname))
+    start, end = get_line_range(lines, node)
+    first = lines[start]
+    indentation = first[: len(first) - len(first.lstrip())]
+    fragment = "".join(
+        indentation + line if line.strip() else line
+        for line in fragment.splitlines(True)
+    )
+    return "".join(lines[:start]) + fragment + "".join(lines[end:])
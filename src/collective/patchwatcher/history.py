@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""History of previous runs for scheduling the declarations.
+
+The history stores the duration, size and outcome of the last check of
+every declaration. It is used to check the declarations which failed last
+time first (so failures show up quickly) and then the slowest declarations
+first (longest processing time first), which keeps parallel runs from
+waiting for a few huge files at the end.
+
+The history file is bounded and may be shared by concurrent runs: it is
+locked (with a ``.lock`` file next to it) while being updated and replaced
+atomically.
+"""
+from collective.patchwatcher import STATUS_CONFLICT
+from collective.patchwatcher import STATUS_ERROR
+from collective.patchwatcher import STATUS_MISSING
+from collective.patchwatcher import STATUS_TIMEOUT
+from collective.patchwatcher.manifest import hash_data
+
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+
+MAX_ENTRIES = 1000
+# estimated seconds per byte for declarations without history
+DEFAULT_RATE = 1e-7
+# outcomes of the last run which let the declaration be checked first
+FAILED_STATUSES = (STATUS_CONFLICT, STATUS_ERROR, STATUS_TIMEOUT, STATUS_MISSING)
+
+
+def get_size(declaration):
+    """Get the size of the files of a declaration as a measure of its processing time."""
+    size = 0
+    for path in (declaration.local_file_path, declaration.current_file_path):
+        try:
+            size += os.path.getsize(path)
+        except OSError:
+            pass
+    return size
+
+
+class History(object):
+    """Durations and outcomes of the declarations of previous runs."""
+
+    def __init__(self, path, max_entries=MAX_ENTRIES):
+        """Load the history.
+
+        :param path: path of the history file
+        :type path: str
+        :param max_entries: maximum number of declarations kept in the history
+        :type max_entries: int
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.entries = self.load()
+        self.updated = {}
+        self.lock = threading.Lock()
+
+    def load(self):
+        try:
+            with io.open(self.path, encoding="utf8") as file:
+                entries = json.load(file).get("entries", {})
+        except (IOError, OSError, ValueError, AttributeError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def get_key(self, declaration):
+        return hash_data(declaration.get_id().encode("utf8"))
+
+    def get(self, declaration):
+        """Get the entry of a declaration.
+
+        :return: entry with duration, size, status and time or None
+        :rtype: dict
+        """
+        return self.entries.get(self.get_key(declaration))
+
+    def get_rate(self):
+        """Get the average processing time per byte of all known declarations."""
+        durations = sizes = 0
+        for entry in self.entries.values():
+            if entry.get("size"):
+                durations += entry.get("duration", 0)
+                sizes += entry["size"]
+        return durations / sizes if durations and sizes else DEFAULT_RATE
+
+    def estimate(self, declaration, rate=None):
+        """Estimate the duration of checking a declaration.
+
+        :param declaration: declaration
+        :type declaration: collective.patchwatcher.Declaration
+        :param rate: processing time per byte for unknown declarations
+        :type rate: float
+        :return: estimated duration in seconds
+        :rtype: float
+        """
+        entry = self.get(declaration)
+        if entry and "duration" in entry:
+            return entry["duration"]
+        return get_size(declaration) * (rate if rate is not None else self.get_rate())
+
+    def record(self, declaration, duration):
+        """Record the duration and status of a checked declaration.
+
+        :param declaration: checked declaration
+        :type declaration: collective.patchwatcher.Declaration
+        :param duration: duration of the check in seconds
+        :type duration: float
+        """
+        entry = {
+            "duration": duration,
+            "size": get_size(declaration),
+            "status": declaration.status,
+            "time": time.time(),
+        }
+        with self.lock:
+            self.updated[self.get_key(declaration)] = entry
+
+    def save(self):
+        """Merge the recorded entries into the history file."""
+        with self.lock:
+            updated = dict(self.updated)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        with io.open(self.path + ".lock", "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            # other runs may have written the history in the meantime
+            entries = self.load()
+            for key, entry in updated.items():
+                if entry["time"] >= entries.get(key, {}).get("time", 0):
+                    entries[key] = entry
+            entries = dict(
+                sorted(
+                    entries.items(), key=lambda item: item[1].get("time", 0), reverse=True
+                )[: self.max_entries]
+            )
+            fd, path = tempfile.mkstemp(dir=directory, prefix=".patchwatcher-history")
+            with io.open(fd, "wb") as file:
+                # json.dumps returns bytes on py2 and text on py3
+                file.write(json.dumps({"entries": entries}, sort_keys=True).encode("utf8"))
+            getattr(os, "replace", os.rename)(path, self.path)
+        self.entries = entries
+
+
+def schedule(declarations, history):
+    """Order the declarations for checking them.
+
+    Declarations that failed last time come first, then the declarations
+    are ordered by their estimated duration (longest first).
+
+    :param declarations: declarations
+    :type declarations: list
+    :param history: history of previous runs
+    :type history: History
+    :return: ordered declarations
+    :rtype: list
+    """
+    rate = history.get_rate()
+
+    def priority(declaration):
+        entry = history.get(declaration) or {}
+        return (
+            entry.get("status") not in FAILED_STATUSES,
+            -history.estimate(declaration, rate),
+        )
+
+    return sorted(declarations, key=priority)
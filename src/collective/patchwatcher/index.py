@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+"""Fetching old vanilla files from a package index (PEP 503 simple index).
+
+Old versions of a package are often not present in the eggs folder anymore,
+but still available on a (local) package index. Instead of downloading the
+whole wheel, only the zip central directory and the needed members are
+read with HTTP range requests over pooled connections. The fetched files are
+stored in a folder with the same layout as an eggs folder, so they can be
+used like any other version of the package.
+"""
+from collective.patchwatcher.manifest import normalize_name
+
+import os
+import pkg_resources
+import re
+import struct
+import threading
+import zlib
+
+
+try:
+    from html.parser import HTMLParser
+    from http.client import HTTPConnection
+    from http.client import HTTPException
+    from http.client import HTTPSConnection
+    from urllib.parse import urljoin
+    from urllib.parse import urlsplit
+except ImportError:  # py2 compatibility
+    from HTMLParser import HTMLParser
+    from httplib import HTTPConnection
+    from httplib import HTTPException
+    from httplib import HTTPSConnection
+    from urlparse import urljoin
+    from urlparse import urlsplit
+
+
+END_OF_CENTRAL_DIRECTORY = struct.Struct("<4s4H2LH")
+CENTRAL_DIRECTORY_ENTRY = struct.Struct("<4s6H3L5H2L")
+LOCAL_FILE_HEADER = struct.Struct("<4s5H3L2H")
+# the end of central directory record is at most 22 bytes plus a 64 KB comment
+TAIL_SIZE = END_OF_CENTRAL_DIRECTORY.size + 65535
+
+
+class PackageIndexError(Exception):
+    """The package index could not provide the requested file."""
+
+
+class LinkParser(HTMLParser):
+    """Collect the links of a simple index page."""
+
+    def __init__(self):
+        HTMLParser.__init__(self)
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            href = dict(attrs).get("href")
+            if href:
+                self.links.append(href)
+
+
+class ConnectionPool(object):
+    """Pool of persistent HTTP connections per host."""
+
+    def __init__(self, timeout=30):
+        self.timeout = timeout
+        self.idle = {}
+        self.lock = threading.Lock()
+        self.created = 0
+
+    def request(self, method, url, headers=None):
+        """Perform a request using a pooled connection.
+
+        :param method: HTTP method
+        :type method: str
+        :param url: absolute URL
+        :type url: str
+        :param headers: request headers
+        :type headers: dict
+        :return: tuple of status, response headers and body
+        :rtype: tuple
+        """
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        for attempt in range(2):
+            connection = self.get_connection(key)
+            try:
+                connection.request(method, path, headers=headers or {})
+                response = connection.getresponse()
+                body = response.read()
+            except (HTTPException, IOError, OSError):
+                connection.close()
+                # a pooled connection may have been closed by the server
+                if attempt:
+                    raise
+                continue
+            if response.getheader("connection", "").lower() == "close":
+                connection.close()
+            else:
+                self.release(key, connection)
+            return response.status, dict(response.getheaders()), body
+
+    def get_connection(self, key):
+        with self.lock:
+            if self.idle.get(key):
+                return self.idle[key].pop()
+            self.created += 1
+        scheme, netloc = key
+        factory = HTTPSConnection if scheme == "https" else HTTPConnection
+        return factory(netloc, timeout=self.timeout)
+
+    def release(self, key, connection):
+        with self.lock:
+            self.idle.setdefault(key, []).append(connection)
+
+    def close(self):
+        with self.lock:
+            connections = [c for idle in self.idle.values() for c in idle]
+            self.idle = {}
+        for connection in connections:
+            connection.close()
+
+
+def get_header(headers, name):
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+
+
+class RemoteZip(object):
+    """Members of a zip file on a server read with range requests."""
+
+    def __init__(self, pool, url):
+        self.pool = pool
+        self.url = url
+        self.data = None  # the whole file, if the server ignores ranges
+        self.entries = None
+
+    def read_range(self, start, end=None):
+        """Read the bytes from start to end (inclusive), negative start reads the tail."""
+        if self.data is not None:
+            return self.data[start:] if end is None else self.data[start : end + 1]
+        if start < 0:
+            byte_range = "bytes={}".format(start)
+        else:
+            byte_range = "bytes={}-{}".format(start, "" if end is None else end)
+        status, headers, body = self.pool.request(
+            "GET", self.url, {"Range": byte_range}
+        )
+        if status == 200:
+            # no support for range requests
+            self.data = body
+            return self.read_range(start, end)
+        if status != 206:
+            raise PackageIndexError("Could not read {} (HTTP {})".format(self.url, status))
+        if start < 0:
+            self.size = int(get_header(headers, "content-range").rsplit("/", 1)[1])
+        return body
+
+    def read_entries(self):
+        """Read the central directory.
+
+        :return: mapping of member names to tuples of compression method, compressed size and offset of the local header
+        :rtype: dict
+        """
+        tail = self.read_range(-TAIL_SIZE)
+        index = tail.rfind(b"PK\x05\x06")
+        if index < 0:
+            raise PackageIndexError("{} is not a zip file".format(self.url))
+        entries, size, offset = END_OF_CENTRAL_DIRECTORY.unpack_from(tail, index)[4:7]
+        total_size = len(self.data) if self.data is not None else self.size
+        tail_offset = total_size - len(tail)
+        if offset >= tail_offset:
+            directory = tail[offset - tail_offset : offset - tail_offset + size]
+        else:
+            directory = self.read_range(offset, offset + size - 1)
+        self.entries = {}
+        position = 0
+        for _entry in range(entries):
+            fields = CENTRAL_DIRECTORY_ENTRY.unpack_from(directory, position)
+            method, compressed_size = fields[4], fields[8]
+            name_length, extra_length, comment_length = fields[10:13]
+            local_offset = fields[16]
+            position += CENTRAL_DIRECTORY_ENTRY.size
+            name = directory[position : position + name_length].decode("utf8")
+            position += name_length + extra_length + comment_length
+            self.entries[name] = (method, compressed_size, local_offset)
+        return self.entries
+
+    def read(self, name):
+        """Read a member.
+
+        :param name: name of the member
+        :type name: str
+        :raises KeyError: Thrown when the member does not exist.
+        :return: content
+        :rtype: bytes
+        """
+        if self.entries is None:
+            self.read_entries()
+        method, compressed_size, offset = self.entries[name]
+        # the length of the extra field of the local header is usually small
+        chunk = self.read_range(
+            offset, offset + LOCAL_FILE_HEADER.size + len(name) + 1024 + compressed_size - 1
+        )
+        fields = LOCAL_FILE_HEADER.unpack_from(chunk)
+        start = LOCAL_FILE_HEADER.size + fields[9] + fields[10]
+        if len(chunk) < start + compressed_size:
+            chunk = self.read_range(offset, offset + start + compressed_size - 1)
+        data = chunk[start : start + compressed_size]
+        if method == 0:
+            return data
+        if method == 8:
+            return zlib.decompress(data, -15)
+        raise PackageIndexError(
+            "Unsupported compression method {} of {}".format(method, name)
+        )
+
+
+class SimpleIndexSource(object):
+    """Vanilla files from a PEP 503 simple index."""
+
+    def __init__(self, index_url, folder, timeout=30):
+        """Initialize the source.
+
+        :param index_url: URL of the simple index (e.g. ``http://pypi.local/simple/``)
+        :type index_url: str
+        :param folder: folder for the fetched files, has the layout of an eggs folder
+        :type folder: str
+        :param timeout: timeout of the connections in seconds
+        :type timeout: float
+        """
+        self.index_url = index_url.rstrip("/") + "/"
+        self.folder = folder
+        self.pool = ConnectionPool(timeout)
+        self.zips = {}
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    def find_wheel(self, project, version):
+        """Find the URL of a wheel of a project.
+
+        :return: URL of the wheel
+        :rtype: str
+        """
+        url = urljoin(self.index_url, normalize_name(project).replace("_", "-") + "/")
+        status, _headers, body = self.pool.request("GET", url)
+        if status != 200:
+            raise PackageIndexError("Could not find {} on the index (HTTP {})".format(project, status))
+        parser = LinkParser()
+        parser.feed(body.decode("utf8"))
+        wanted = pkg_resources.parse_version(version)
+        for link in parser.links:
+            filename = link.split("#", 1)[0].rsplit("/", 1)[-1]
+            if not filename.endswith(".whl"):
+                continue
+            name, wheel_version = filename.split("-")[:2]
+            if normalize_name(name) == normalize_name(project) and (
+                pkg_resources.parse_version(wheel_version) == wanted
+            ):
+                return urljoin(url, link.split("#", 1)[0])
+        raise PackageIndexError("No wheel of {} {} found on the index".format(project, version))
+
+    def get_zip(self, project, version):
+        key = (normalize_name(project), str(version))
+        with self.lock:
+            lock = self.locks.setdefault(key, threading.Lock())
+        # concurrent fetches of the same version look up the wheel only once
+        with lock:
+            if key not in self.zips:
+                remote_zip = RemoteZip(self.pool, self.find_wheel(project, version))
+                remote_zip.read_entries()
+                self.zips[key] = remote_zip
+            return self.zips[key]
+
+    def get_location(self, project, version):
+        """Get the location of the fetched files of a distribution (like an egg in an eggs folder)."""
+        return os.path.join(
+            self.folder,
+            "{}-{}".format(pkg_resources.to_filename(pkg_resources.safe_name(project)), version),
+        )
+
+    def fetch(self, project, version, path):
+        """Fetch a file of a distribution into the folder of the source.
+
+        The ``RECORD`` of the wheel is fetched as well, so the file hashes
+        are available for the manifests.
+
+        :param project: name of the project
+        :type project: str
+        :param version: version of the project
+        :type version: str
+        :param path: path of the file relative to the root of the wheel
+        :type path: str
+        :raises PackageIndexError: Thrown when the file could not be fetched.
+        :return: location of the distribution
+        :rtype: str
+        """
+        location = self.get_location(project, version)
+        path = path.replace(os.sep, "/")
+        remote_zip = self.get_zip(project, version)
+        names = [path] + [
+            name
+            for name in remote_zip.entries
+            if re.match(r"[^/]+\.dist-info/RECORD$", name)
+        ]
+        for name in names:
+            target = os.path.join(location, *name.split("/"))
+            if os.path.isfile(target):
+                continue
+            try:
+                data = remote_zip.read(name)
+            except KeyError:
+                raise PackageIndexError("{} {} has no file {}".format(project, version, name))
+            if not os.path.isdir(os.path.dirname(target)):
+                os.makedirs(os.path.dirname(target))
+            temporary = "{}.{}.tmp".format(target, threading.current_thread().ident)
+            with open(temporary, "wb") as file:
+                file.write(data)
+            getattr(os, "replace", os.rename)(temporary, target)
+        return location
+
+
+def fetch_missing(source, declarations, eggs_folder, logger, jobs=8):
+    """Fetch the old vanilla files, which are not in the eggs folder, from the index.
+
+    The files are fetched concurrently, the wheels of the same version are
+    only looked up once.
+
+    :param source: index source
+    :type source: collective.patchwatcher.index.SimpleIndexSource
+    :param declarations: declarations
+    :type declarations: list
+    :param eggs_folder: location of the eggs folder (or list of locations)
+    :type eggs_folder: str
+    :param logger: logger
+    :type logger: logging.Logger
+    :param jobs: number of concurrent fetches
+    :type jobs: int
+    :return: number of fetched files
+    :rtype: int
+    """
+    missing = []
+    for declaration in declarations:
+        if declaration.is_latest():
+            continue
+        location = declaration.get_previous_location(eggs_folder)
+        if location is None or not os.path.isfile(
+            os.path.join(location, declaration.distribution_path)
+        ):
+            missing.append(declaration)
+
+    def fetch(declaration):
+        try:
+            source.fetch(
+                declaration.package,
+                str(declaration.version),
+                declaration.distribution_path,
+            )
+        except (PackageIndexError, HTTPException, IOError, OSError) as e:
+            logger.warning(
+                "Could not fetch {path} of {package} {version} from the index: {error}".format(
+                    path=declaration.path,
+                    package=declaration.package,
+                    version=str(declaration.version),
+                    error=e,
+                )
+            )
+            return False
+        return True
+
+    if jobs <= 1:
+        return len([1 for declaration in missing if fetch(declaration)])
+    from concurrent.futures import ThreadPoolExecutor
+
+    executor = ThreadPoolExecutor(max_workers=jobs)
+    try:
+        fetched = list(executor.map(fetch, missing))
+    finally:
+        executor.shutdown()
+    return len([1 for ok in fetched if ok])
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""Hash manifests of installed distributions.
+
+Wheels ship a ``RECORD`` file listing a hash for every file of the
+distribution (and eggs converted from wheels often keep it). These hashes
+allow to answer whether a file changed between two versions of a project
+without reading the file itself. If no manifest is available, the files are
+hashed on demand.
+"""
+import base64
+import csv
+import glob
+import hashlib
+import io
+import os
+import re
+
+
+HASH_ALGORITHM = "sha256"
+
+_manifests = {}
+
+
+def normalize_name(name):
+    """Normalize a project name for comparing it with metadata folder names.
+
+    :param name: project name
+    :type name: str
+    :return: normalized name
+    :rtype: str
+    """
+    return re.sub(r"[-_.]+", "_", name).lower()
+
+
+def hash_data(data, algorithm=HASH_ALGORITHM):
+    """Hash some data in the format used by ``RECORD`` files.
+
+    :param data: data to be hashed
+    :type data: bytes
+    :param algorithm: name of the hash algorithm
+    :type algorithm: str
+    :return: hash like ``sha256=<urlsafe base64 digest>``
+    :rtype: str
+    """
+    digest = hashlib.new(algorithm, data).digest()
+    return "{algorithm}={digest}".format(
+        algorithm=algorithm,
+        digest=base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii"),
+    )
+
+
+def hash_file(path, algorithm=HASH_ALGORITHM):
+    """Hash a file in the format used by ``RECORD`` files.
+
+    :param path: path of the file
+    :type path: str
+    :param algorithm: name of the hash algorithm
+    :type algorithm: str
+    :return: hash of the file or None, if the file does not exist
+    :rtype: str
+    """
+    try:
+        with open(path, "rb") as file:
+            return hash_data(file.read(), algorithm)
+    except (IOError, OSError):
+        return None
+
+
+def normalize_path(path):
+    """Normalize a relative path to the form used in ``RECORD`` files."""
+    return os.path.normpath(path).replace(os.sep, "/")
+
+
+def parse_record(text):
+    """Parse the content of a ``RECORD`` file.
+
+    :param text: content of the ``RECORD`` file
+    :type text: str
+    :return: mapping of relative paths to hashes (files without hash are omitted)
+    :rtype: dict
+    """
+    hashes = {}
+    for row in csv.reader(io.StringIO(text)):
+        if len(row) < 2 or "=" not in row[1]:
+            continue
+        hashes[normalize_path(row[0])] = row[1]
+    return hashes
+
+
+def find_record(location, project_name):
+    """Find the ``RECORD`` file of a distribution.
+
+    :param location: location of the distribution (e.g. the egg folder or site-packages)
+    :type location: str
+    :param project_name: name of the project
+    :type project_name: str
+    :return: path of the ``RECORD`` file or None
+    :rtype: str
+    """
+    candidates = [os.path.join(location, "EGG-INFO", "RECORD")]
+    project = normalize_name(project_name)
+    for dist_info in glob.glob(os.path.join(location, "*.dist-info")):
+        name = os.path.basename(dist_info).rsplit("-", 1)[0]
+        if normalize_name(name) == project:
+            candidates.append(os.path.join(dist_info, "RECORD"))
+    for candidate in candidates:
+        if os.path.isfile(candidate):
+            return candidate
+
+
+class HashManifest(object):
+    """Hashes of the files of a single distribution."""
+
+    def __init__(self, location, hashes=None):
+        """Initialize the manifest.
+
+        :param location: location of the distribution, all paths are relative to it
+        :type location: str
+        :param hashes: precomputed hashes (e.g. from a ``RECORD`` file)
+        :type hashes: dict
+        """
+        self.location = location
+        self.has_record = hashes is not None
+        self.hashes = dict(hashes or {})
+
+    def get(self, path, algorithm=None):
+        """Get the hash of a file.
+
+        :param path: path relative to the location of the distribution
+        :type path: str
+        :param algorithm: required hash algorithm, any algorithm if omitted
+        :type algorithm: str
+        :return: hash of the file or None, if it does not exist
+        :rtype: str
+        """
+        path = normalize_path(path)
+        if path not in self.hashes:
+            self.hashes[path] = hash_file(os.path.join(self.location, path))
+        digest = self.hashes[path]
+        if digest is not None and algorithm and not digest.startswith(algorithm + "="):
+            return hash_file(os.path.join(self.location, path), algorithm)
+        return digest
+
+    def paths(self):
+        """List all files of the distribution.
+
+        :return: relative paths of all files
+        :rtype: set
+        """
+        if self.has_record:
+            return set(path for path in self.hashes if self.hashes[path])
+        paths = set()
+        for root, _dirs, files in os.walk(self.location):
+            for name in files:
+                paths.add(
+                    normalize_path(
+                        os.path.relpath(os.path.join(root, name), self.location)
+                    )
+                )
+        return paths
+
+
+def get_manifest(location, project_name):
+    """Get the (cached) manifest of a distribution.
+
+    :param location: location of the distribution
+    :type location: str
+    :param project_name: name of the project
+    :type project_name: str
+    :return: manifest
+    :rtype: HashManifest
+    """
+    key = (os.path.normpath(location), normalize_name(project_name))
+    if key not in _manifests:
+        record = find_record(location, project_name)
+        hashes = None
+        if record:
+            with io.open(record, encoding="utf8") as file:
+                hashes = parse_record(file.read())
+        _manifests[key] = HashManifest(location, hashes)
+    return _manifests[key]
+
+
+def file_changed(old_manifest, new_manifest, path):
+    """Check if a file changed between two distributions.
+
+    :param old_manifest: manifest of the old distribution
+    :type old_manifest: HashManifest
+    :param new_manifest: manifest of the new distribution
+    :type new_manifest: HashManifest
+    :param path: path relative to the location of the distributions
+    :type path: str
+    :return: True, if the file changed or is missing in one of the distributions
+    :rtype: boolean
+    """
+    old_hash = old_manifest.get(path)
+    if old_hash is None:
+        return True
+    new_hash = new_manifest.get(path, algorithm=old_hash.split("=", 1)[0])
+    return new_hash is None or old_hash != new_hash
+
+
+def changed_files(old_manifest, new_manifest, paths=None):
+    """List the files that differ between two distributions.
+
+    :param old_manifest: manifest of the old distribution
+    :type old_manifest: HashManifest
+    :param new_manifest: manifest of the new distribution
+    :type new_manifest: HashManifest
+    :param paths: paths relative to the locations of the distributions, which are compared; all files, if omitted
+    :type paths: list
+    :return: sorted relative paths (in the form used in ``RECORD`` files) of added, removed and changed files
+    :rtype: list
+    """
+    if paths is None:
+        paths = old_manifest.paths() | new_manifest.paths()
+    else:
+        paths = set(normalize_path(path) for path in paths)
+    return sorted(
+        path
+        for path in paths
+        if not path.endswith(".pyc")
+        and not path.startswith("EGG-INFO/")
+        and ".dist-info/" not in path
+        and file_changed(old_manifest, new_manifest, path)
+    )
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Detection of overrides, which are not needed anymore."""
+from collective.patchwatcher import FunctionDeclaration
+from collective.patchwatcher.manifest import hash_data
+
+import re
+
+
+# the override is identical to the current vanilla file and can be deleted
+OBSOLETE_IDENTICAL = "identical"
+# the override differs only in whitespace from the current vanilla file and can be deleted
+OBSOLETE_WHITESPACE = "whitespace"
+# the vanilla file did not change since the declared version, only the version needs to be updated
+OBSOLETE_VERSION = "version"
+
+WHITESPACE = re.compile(br"\s+")
+
+
+def normalized_hash(data, keep_indentation=False):
+    """Hash some data ignoring differences in whitespace.
+
+    :param data: data to be hashed
+    :type data: bytes
+    :param keep_indentation: only ignore trailing whitespace and blank lines, but keep the line structure and indentation (e.g. for Python code)
+    :type keep_indentation: boolean
+    :return: hash like ``sha256=...``
+    :rtype: str
+    """
+    if keep_indentation:
+        lines = [line.rstrip() for line in data.splitlines()]
+        return hash_data(b"\n".join(line for line in lines if line))
+    return hash_data(WHITESPACE.sub(b" ", data).strip())
+
+
+def is_python(declaration):
+    return isinstance(declaration, FunctionDeclaration) or declaration.path.endswith(
+        ".py"
+    )
+
+
+def find_obsolete(declarations, eggs_folder, logger):
+    """Find overrides that can be deleted and declarations that only need a version bump.
+
+    The current vanilla files are fingerprinted using the manifests of the
+    distributions. Only if the exact hashes differ, the whitespace-normalized
+    hashes of the override and the vanilla file are computed. Python code
+    keeps its indentation, since it is significant.
+
+    :param declarations: declarations to inspect
+    :type declarations: list
+    :param eggs_folder: location of the eggs folder
+    :type eggs_folder: str
+    :param logger: logger
+    :type logger: object
+    :return: list of tuples of declaration and reason (one of the ``OBSOLETE_*`` constants)
+    :rtype: list
+    """
+    results = []
+    for declaration in declarations:
+        try:
+            local_source = declaration.get_local_source()
+            if hash_data(local_source) == declaration.get_current_hash():
+                results.append((declaration, OBSOLETE_IDENTICAL))
+                continue
+            keep_indentation = is_python(declaration)
+            if normalized_hash(local_source, keep_indentation) == normalized_hash(
+                declaration.get_current_source(), keep_indentation
+            ):
+                results.append((declaration, OBSOLETE_WHITESPACE))
+                continue
+            if declaration.is_latest():
+                continue
+            previous_location = declaration.get_previous_location(eggs_folder)
+            if previous_location and not declaration.has_changed(previous_location):
+                results.append((declaration, OBSOLETE_VERSION))
+        except (IOError, OSError, LookupError, SyntaxError) as e:
+            logger.error(
+                "Could not inspect the override {local_path} of package {local_package}: {error}".format(
+                    local_path=declaration.local_path,
+                    local_package=declaration.local_package,
+                    error=e,
+                )
+            )
+    return results
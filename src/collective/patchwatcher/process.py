@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""Running external tools (diff, diff3) with time budgets and resource limits."""
+import os
+import subprocess
+import threading
+import time
+
+
+_processes = set()
+_lock = threading.Lock()
+# set when the run is cancelled, no tools are started anymore
+_cancelled = threading.Event()
+
+
+class CommandTimeout(Exception):
+    """The time budget was exhausted while running an external tool."""
+
+
+class CommandCancelled(CommandTimeout):
+    """The run was cancelled (e.g. by Ctrl-C) before or while running an external tool."""
+
+
+class Limits(object):
+    """Time budget and resource limits for the external tools of a check."""
+
+    def __init__(self, timeout=None, cpu_time=None, memory=None):
+        """Initialize the limits. The time budget starts immediately.
+
+        :param timeout: time budget in seconds for all tools of the check
+        :type timeout: float
+        :param cpu_time: CPU time limit in seconds for every single tool
+        :type cpu_time: int
+        :param memory: memory limit in MB for every single tool
+        :type memory: int
+        """
+        self.deadline = time.time() + timeout if timeout is not None else None
+        self.cpu_time = cpu_time
+        self.memory = memory
+
+    def remaining(self):
+        """Remaining time of the budget.
+
+        :return: remaining seconds or None, if there is no time budget
+        :rtype: float
+        """
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.time(), 0)
+
+    def wrap(self, args):
+        """Wrap a command line for applying the resource limits.
+
+        The limits are set with ``ulimit`` by a shell, which then executes
+        the tool. Unlike a ``preexec_fn`` this is safe with running threads.
+
+        :param args: command line
+        :type args: list
+        :return: wrapped command line
+        :rtype: list
+        """
+        if os.name != "posix" or not (self.cpu_time or self.memory):
+            return args
+        ulimits = []
+        if self.cpu_time:
+            ulimits.append("ulimit -t {:d}".format(self.cpu_time))
+        if self.memory:
+            ulimits.append("ulimit -v {:d}".format(self.memory * 1024))
+        script = "; ".join(ulimits + ['exec "$@"'])
+        return ["sh", "-c", script, "sh"] + list(args)
+
+
+def _expire(p, expired):
+    """Kill a process, which exceeded its time budget."""
+    expired.set()
+    try:
+        p.kill()
+    except OSError:  # the process has already finished
+        pass
+
+
+def run_command(args, limits=None, cwd=None):
+    """Run an external tool and return its output.
+
+    The process is killed, if the time budget is exhausted or the run is
+    interrupted (e.g. by Ctrl-C).
+
+    :param args: command line
+    :type args: list
+    :param limits: time budget and resource limits
+    :type limits: Limits
+    :param cwd: working directory of the tool
+    :type cwd: str
+    :raises CommandTimeout: Thrown when the time budget is exhausted.
+    :raises CommandCancelled: Thrown when the run was cancelled.
+    :return: tuple of stdout, stderr and return code
+    :rtype: tuple
+    """
+    if _cancelled.is_set():
+        raise CommandCancelled("The run was cancelled")
+    limits = limits or Limits()
+    timeout = limits.remaining()
+    if timeout is not None and timeout <= 0:
+        raise CommandTimeout("No time left for running {}".format(args[0]))
+    p = subprocess.Popen(
+        limits.wrap(args),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=cwd,
+    )
+    with _lock:
+        _processes.add(p)
+        cancelled = _cancelled.is_set()
+    if cancelled:
+        # kill_all did not see the process anymore
+        p.kill()
+        p.communicate()
+        with _lock:
+            _processes.discard(p)
+        raise CommandCancelled("The run was cancelled")
+    # communicate has no timeout on py2, a timer kills the process instead
+    expired = threading.Event()
+    timer = None
+    if timeout is not None:
+        timer = threading.Timer(timeout, _expire, (p, expired))
+        timer.daemon = True
+        timer.start()
+    try:
+        output, err = p.communicate()
+    except BaseException:
+        p.kill()
+        p.wait()
+        raise
+    finally:
+        if timer is not None:
+            timer.cancel()
+        with _lock:
+            _processes.discard(p)
+    if _cancelled.is_set():
+        raise CommandCancelled("The run was cancelled")
+    if expired.is_set():
+        raise CommandTimeout(
+            "{} did not finish within {:.1f} seconds".format(args[0], timeout)
+        )
+    if p.returncode < 0:
+        # e.g. SIGXCPU or SIGKILL caused by the resource limits
+        err += "{} was terminated by signal {}".format(
+            args[0], -p.returncode
+        ).encode("utf8")
+    return output, err, p.returncode
+
+
+def kill_all():
+    """Kill all running external tools and refuse to start new ones.
+
+    :return: number of killed processes
+    :rtype: int
+    """
+    with _lock:
+        _cancelled.set()
+        processes = list(_processes)
+        _processes.clear()
+    for p in processes:
+        try:
+            p.kill()
+        except OSError:
+            pass
+    return len(processes)
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""Progress of a patchwatcher run."""
+import threading
+import time
+
+
+def format_duration(seconds):
+    """Format a duration like ``1:02:03``.
+
+    :param seconds: duration in seconds
+    :type seconds: float
+    :return: formatted duration
+    :rtype: str
+    """
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return "{}:{:02d}:{:02d}".format(hours, minutes, seconds)
+
+
+class Progress(object):
+    """Progress of checking the declarations with an estimated time of arrival."""
+
+    def __init__(self, total):
+        """Start tracking the progress.
+
+        :param total: number of declarations to check
+        :type total: int
+        """
+        self.total = total
+        self.done = 0
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def update(self):
+        """Count a completed declaration."""
+        with self.lock:
+            self.done += 1
+
+    def eta(self):
+        """Estimate the remaining time based on the completed declarations.
+
+        :return: remaining seconds or None, if nothing was completed yet
+        :rtype: float
+        """
+        if not self.done:
+            return None
+        elapsed = time.time() - self.started
+        return elapsed / self.done * (self.total - self.done)
+
+    def __str__(self):
+        eta = self.eta()
+        return "[{done}/{total}] elapsed {elapsed}, ETA {eta}".format(
+            done=self.done,
+            total=self.total,
+            elapsed=format_duration(time.time() - self.started),
+            eta=format_duration(eta) if eta is not None else "unknown",
+        )
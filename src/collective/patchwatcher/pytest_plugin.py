@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""pytest plugin checking the declarations of overridden files.
+
+Every declaration in the ``overrides_info`` modules of the selected packages
+becomes a test item, which fails with the merge diff if the vanilla file
+changed in a way that could not be merged without conflicts::
+
+    pytest --patchwatcher my.package,my.other.package --patchwatcher-eggs ~/eggs
+
+The ``overrides_info`` modules are parsed and not imported during the
+collection, so the add-on packages are only imported when the items run.
+Declarations whose arguments are not literals become failing items.
+Items whose override and vanilla file did not change since their last
+successful run are skipped using the pytest cache. The items are plain
+test items and can be distributed with pytest-xdist.
+
+The plugin needs Python 3 and pytest 7 or later; with older versions it is
+registered, but refuses to check any declarations.
+"""
+from collective.patchwatcher import Declaration
+from collective.patchwatcher import FunctionDeclaration
+from collective.patchwatcher.manifest import hash_data
+from collective.patchwatcher.report import ANSI_ESCAPE
+
+import ast
+import logging
+import os
+import pkg_resources
+import pytest
+
+
+try:
+    from pathlib import Path
+except ImportError:  # py2 compatibility
+    Path = None
+
+# collecting items with from_parent(path=...) needs pytest 7
+SUPPORTED = Path is not None and int(pytest.__version__.split(".")[0]) >= 7
+
+logger = logging.getLogger("collective.patchwatcher")
+
+ARGUMENTS = {
+    "add": ("package", "version", "path", "local_path"),
+    "add_function": ("package", "version", "name", "local_path", "local_name"),
+}
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("patchwatcher")
+    group.addoption(
+        "--patchwatcher",
+        metavar="PACKAGES",
+        help="check the declarations of the overridden files of the packages (separated by commata)",
+    )
+    group.addoption(
+        "--patchwatcher-eggs",
+        metavar="EGGS_FOLDER",
+        help="eggs folder for looking up the sources of the vanilla files",
+    )
+    parser.addini(
+        "patchwatcher_packages",
+        "packages whose declarations of overridden files are checked",
+        type="args",
+        default=[],
+    )
+    parser.addini(
+        "patchwatcher_eggs_folder",
+        "eggs folder for looking up the sources of the vanilla files",
+        default="",
+    )
+
+
+def get_packages(config):
+    packages = config.getoption("patchwatcher")
+    if packages:
+        return [package.strip() for package in packages.split(",") if package.strip()]
+    return config.getini("patchwatcher_packages")
+
+
+def find_overrides_info(package):
+    """Find the ``overrides_info`` module of a package without importing the package.
+
+    :param package: name of the package
+    :type package: str
+    :return: path of the module or None
+    :rtype: str
+    """
+    try:
+        distribution = pkg_resources.get_distribution(package)
+    except pkg_resources.DistributionNotFound:
+        return None
+    path = os.path.join(
+        distribution.location, *(package.split(".") + ["overrides_info.py"])
+    )
+    if os.path.isfile(path):
+        return path
+
+
+def read_declarations(path, local_package):
+    """Read the declarations of an ``overrides_info`` module without importing it.
+
+    Only the literal arguments of the declarations can be read, the
+    arguments of other declarations are None.
+
+    :param path: path of the module
+    :type path: str
+    :param local_package: package of the module
+    :type local_package: str
+    :return: list of tuples of the line number, the method (``add`` or ``add_function``) and its arguments
+    :rtype: list
+    """
+    with open(path, "rb") as file:
+        tree = ast.parse(file.read(), path)
+    declarations = []
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        name = getattr(node.func, "attr", getattr(node.func, "id", None))
+        try:
+            if name == "DeclarationCollection":
+                for arg in node.args[:1]:
+                    local_package = ast.literal_eval(arg)
+                for keyword in node.keywords:
+                    if keyword.arg == "local_package":
+                        local_package = ast.literal_eval(keyword.value)
+        except ValueError:
+            continue
+        if name not in ARGUMENTS or not isinstance(node.func, ast.Attribute):
+            continue
+        try:
+            arguments = dict(
+                zip(ARGUMENTS[name], [ast.literal_eval(arg) for arg in node.args])
+            )
+            for keyword in node.keywords:
+                arguments[keyword.arg] = ast.literal_eval(keyword.value)
+        except ValueError:
+            arguments = None
+        declarations.append((node.lineno, name, arguments))
+    return [
+        (
+            lineno,
+            name,
+            None if arguments is None else dict(arguments, local_package=local_package),
+        )
+        for lineno, name, arguments in sorted(declarations, key=lambda d: d[0])
+    ]
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_collection_modifyitems(session, config, items):
+    packages = get_packages(config)
+    if not packages:
+        return
+    if not SUPPORTED:
+        raise pytest.UsageError(
+            "The patchwatcher plugin needs Python 3 and pytest >= 7"
+        )
+    for package in packages:
+        path = find_overrides_info(package)
+        if not path:
+            raise pytest.UsageError(
+                "Could not find {}.overrides_info".format(package)
+            )
+        overrides_info = OverridesInfo.from_parent(
+            session, path=Path(path), package=package
+        )
+        items.extend(overrides_info.collect())
+
+
+class OverridesInfo(pytest.File):
+    """The declarations of an ``overrides_info`` module."""
+
+    def __init__(self, package, **kwargs):
+        super(OverridesInfo, self).__init__(**kwargs)
+        self.package = package
+
+    def collect(self):
+        names = set()
+        for lineno, method, arguments in read_declarations(str(self.path), self.package):
+            if arguments is None:
+                # a declaration, which can not be checked, must not pass unnoticed
+                yield UnreadableDeclarationItem.from_parent(
+                    self, name="{} in line {}".format(method, lineno), lineno=lineno
+                )
+                continue
+            name = "{local_path} <- {package}:{target}".format(
+                local_path=os.path.normpath(arguments.get("local_path", "")),
+                package=arguments.get("package"),
+                target=arguments.get("name") or os.path.normpath(arguments.get("path", "")),
+            )
+            if name in names:
+                continue
+            names.add(name)
+            yield DeclarationItem.from_parent(
+                self, name=name, method=method, arguments=arguments
+            )
+
+
+class DeclarationItem(pytest.Item):
+    """A single declaration of an overridden file or patched function."""
+
+    def __init__(self, method, arguments, **kwargs):
+        super(DeclarationItem, self).__init__(**kwargs)
+        self.method = method
+        self.arguments = arguments
+        self.declaration = None
+        self.diffs = {}
+
+    def get_declaration(self):
+        arguments = dict(self.arguments)
+        if self.method == "add_function":
+            return FunctionDeclaration(**arguments)
+        return Declaration(**arguments)
+
+    def get_fingerprint(self, declaration):
+        return [
+            declaration.get_id(),
+            str(declaration.version),
+            str(declaration.distribution.version),
+            hash_data(declaration.get_local_source()),
+            declaration.get_current_hash(),
+        ]
+
+    def runtest(self):
+        eggs_folder = self.config.getoption("patchwatcher_eggs") or self.config.getini(
+            "patchwatcher_eggs_folder"
+        )
+        if not eggs_folder:
+            raise pytest.UsageError(
+                "The eggs folder is missing, use --patchwatcher-eggs or patchwatcher_eggs_folder"
+            )
+        self.declaration = declaration = self.get_declaration()
+        key = "patchwatcher/" + hash_data(self.nodeid.encode("utf8")).split("=", 1)[1]
+        fingerprint = self.get_fingerprint(declaration)
+        if self.config.cache.get(key, None) == fingerprint:
+            pytest.skip("override and vanilla file did not change since the last successful check")
+        self.config.cache.set(key, None)
+        if not declaration.check(logger, eggs_folder, False, reporter=self):
+            raise DriftError(declaration.status)
+        self.config.cache.set(key, fingerprint)
+
+    def add(self, declaration):
+        """Receive the diffs of the check (see Declaration.check)."""
+        self.diffs = dict(declaration.diffs)
+
+    def repr_failure(self, excinfo):
+        if not isinstance(excinfo.value, DriftError):
+            return super(DeclarationItem, self).repr_failure(excinfo)
+        declaration = self.declaration
+        message = "{status}: {package} {version} -> {current_version}".format(
+            status=declaration.status,
+            package=declaration.package,
+            version=declaration.version,
+            current_version=declaration.distribution.version,
+        )
+        if declaration.conflicts:
+            message += " ({} conflicts)".format(declaration.conflicts)
+        diff = self.diffs.get("merge") or self.diffs.get("old_current")
+        if diff:
+            message += "\n\n" + ANSI_ESCAPE.sub("", diff)
+        return message
+
+    def reportinfo(self):
+        return self.path, None, "patchwatcher: {}".format(self.name)
+
+
+class UnreadableDeclarationItem(pytest.Item):
+    """A declaration, whose arguments are not literals and can not be read."""
+
+    def __init__(self, lineno, **kwargs):
+        super(UnreadableDeclarationItem, self).__init__(**kwargs)
+        self.lineno = lineno
+
+    def runtest(self):
+        raise UnreadableDeclarationError()
+
+    def repr_failure(self, excinfo):
+        if not isinstance(excinfo.value, UnreadableDeclarationError):
+            return super(UnreadableDeclarationItem, self).repr_failure(excinfo)
+        return "{path}:{lineno}: the arguments of the declaration are not literals and can not be read without importing the module".format(
+            path=self.path, lineno=self.lineno
+        )
+
+    def reportinfo(self):
+        return self.path, self.lineno - 1, "patchwatcher: {}".format(self.name)
+
+
+class UnreadableDeclarationError(Exception):
+    """The arguments of a declaration are not literals."""
+
+
+class DriftError(Exception):
+    """The override could not be merged with the current vanilla file."""
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""Static HTML report of a patchwatcher run.
+
+The report consists of an ``index.html`` listing all declarations and a
+``fragments`` folder holding the compressed diffs. A fragment is a small
+script, which is only loaded by the page when the corresponding diff is
+expanded. This keeps the index small and works offline (``file://``),
+e.g. when browsing the report as a CI artifact.
+
+The report is written while the results arrive, so the diffs never have to
+be kept in memory.
+"""
+import base64
+import io
+import os
+import re
+import threading
+import zlib
+
+
+try:
+    from html import escape
+except ImportError:  # py2 compatibility
+    from cgi import escape
+
+
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+
+DIFF_TITLES = {
+    "customized_current": "overridden file vs. current file",
+    "old_current": "old file vs. current file",
+    "merge": "overridden file vs. merge result",
+}
+
+HEADER = u"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Patchwatcher report</title>
+<style>
+body {{ font-family: sans-serif; margin: 1em; }}
+table {{ border-collapse: collapse; width: 100%; }}
+th, td {{ border: 1px solid #ccc; padding: 0.3em; text-align: left; vertical-align: top; }}
+tr.diffs td {{ border-top: none; }}
+pre {{ background: #f6f6f6; overflow-x: auto; padding: 0.5em; }}
+.status-latest, .status-unchanged {{ color: #2a7a2a; }}
+.status-merged {{ color: #1f5fa8; }}
+.status-conflict, .status-missing, .status-error, .status-timeout {{ color: #b00; font-weight: bold; }}
+</style>
+<script>
+function patchwatcherToggle(id) {{
+  var element = document.getElementById(id);
+  if (element.getAttribute("data-loaded")) {{
+    element.hidden = !element.hidden;
+    return;
+  }}
+  var script = document.createElement("script");
+  script.src = "fragments/" + id + ".js";
+  document.body.appendChild(script);
+}}
+function patchwatcherFragment(id, data) {{
+  var element = document.getElementById(id);
+  var binary = atob(data);
+  var bytes = new Uint8Array(binary.length);
+  for (var i = 0; i < binary.length; i++) {{
+    bytes[i] = binary.charCodeAt(i);
+  }}
+  var stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream("deflate"));
+  new Response(stream).text().then(function (text) {{
+    element.textContent = text;
+    element.setAttribute("data-loaded", "1");
+    element.hidden = false;
+  }});
+}}
+</script>
+</head>
+<body>
+<h1>Patchwatcher report</h1>
+<table>
+<tr><th>#</th><th>Package</th><th>Override</th><th>Vanilla file</th><th>Version</th><th>Current version</th><th>Status</th><th>Conflicts</th></tr>
+"""
+
+ROW = u"""<tr><td>{number}</td><td>{local_package}</td><td>{local_path}</td><td>{package}: {path}</td><td>{version}</td><td>{current_version}</td><td class="status-{status}">{status}</td><td>{conflicts}</td></tr>
+"""
+
+DIFFS = u"""<tr class="diffs"><td></td><td colspan="7">{diffs}</td></tr>
+"""
+
+DIFF = u"""<button type="button" onclick="patchwatcherToggle('{id}')">{title}</button><pre id="{id}" hidden></pre>"""
+
+FOOTER = u"""</table>
+<p>{summary}</p>
+</body>
+</html>
+"""
+
+
+class HtmlReport(object):
+    """Report written into a directory."""
+
+    def __init__(self, directory):
+        """Start the report.
+
+        :param directory: directory of the report, will be created if necessary
+        :type directory: str
+        """
+        self.directory = directory
+        self.fragments_directory = os.path.join(directory, "fragments")
+        if not os.path.isdir(self.fragments_directory):
+            os.makedirs(self.fragments_directory)
+        self.count = 0
+        self.statuses = {}
+        self.lock = threading.Lock()
+        self.index = io.open(os.path.join(directory, "index.html"), "w", encoding="utf8")
+        self.index.write(HEADER.format())
+        self.index.flush()
+
+    def write_fragment(self, fragment_id, text):
+        """Write a compressed diff, which is loaded on demand by the index.
+
+        :param fragment_id: id of the fragment
+        :type fragment_id: str
+        :param text: diff
+        :type text: str
+        """
+        data = base64.b64encode(
+            zlib.compress(ANSI_ESCAPE.sub("", text).encode("utf8"), 9)
+        ).decode("ascii")
+        path = os.path.join(self.fragments_directory, fragment_id + ".js")
+        with io.open(path, "w", encoding="utf8") as file:
+            file.write(
+                u'patchwatcherFragment("{id}", "{data}");\n'.format(
+                    id=fragment_id, data=data
+                )
+            )
+
+    def add(self, declaration):
+        """Add the result of a checked declaration.
+
+        :param declaration: checked declaration
+        :type declaration: collective.patchwatcher.Declaration
+        """
+        with self.lock:
+            # checks still running after an interruption may finish late
+            if not self.index.closed:
+                self._add(declaration)
+
+    def _add(self, declaration):
+        self.count += 1
+        status = declaration.status or "unknown"
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.index.write(
+            ROW.format(
+                number=self.count,
+                local_package=escape(declaration.local_package),
+                local_path=escape(declaration.local_path),
+                package=escape(declaration.package),
+                path=escape(declaration.path),
+                version=escape(str(declaration.version)),
+                current_version=escape(str(declaration.distribution.version))
+                if not declaration.changed_version
+                else "{} (changed in version {})".format(
+                    escape(str(declaration.distribution.version)),
+                    escape(declaration.changed_version),
+                ),
+                status=escape(status),
+                conflicts=declaration.conflicts
+                if not declaration.conflict_version
+                else "{} (caused by version {})".format(
+                    declaration.conflicts, escape(declaration.conflict_version)
+                ),
+            )
+        )
+        diffs = []
+        for name in sorted(declaration.diffs):
+            if not declaration.diffs[name]:
+                continue
+            fragment_id = "{:05d}-{}".format(self.count, name)
+            self.write_fragment(fragment_id, declaration.diffs[name])
+            diffs.append(
+                DIFF.format(id=fragment_id, title=escape(DIFF_TITLES.get(name, name)))
+            )
+        if diffs:
+            self.index.write(DIFFS.format(diffs="".join(diffs)))
+        self.index.flush()
+
+    def close(self):
+        """Finish the report."""
+        with self.lock:
+            self._close()
+
+    def _close(self):
+        summary = ", ".join(
+            "{}: {}".format(status, count) for status, count in sorted(self.statuses.items())
+        )
+        self.index.write(
+            FOOTER.format(
+                summary=escape(
+                    "{} declarations checked. {}".format(self.count, summary)
+                )
+            )
+        )
+        self.index.close()
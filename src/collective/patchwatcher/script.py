@@ -3,12 +3,27 @@
 
 Example usage: /bin/patchwatcher -e "/home/username/zinstance/eggs" -p some.addon, some.other.addon -m
 """
+from collective.patchwatcher.batch import batch_diff
+from collective.patchwatcher.chain import MergeChain
+from collective.patchwatcher.history import History
+from collective.patchwatcher.history import schedule
+from collective.patchwatcher.index import fetch_missing
+from collective.patchwatcher.index import SimpleIndexSource
+from collective.patchwatcher.obsolete import find_obsolete
+from collective.patchwatcher.obsolete import OBSOLETE_IDENTICAL
+from collective.patchwatcher.obsolete import OBSOLETE_VERSION
+from collective.patchwatcher.obsolete import OBSOLETE_WHITESPACE
+from collective.patchwatcher.process import kill_all
+from collective.patchwatcher.process import Limits
+from collective.patchwatcher.progress import Progress
+from collective.patchwatcher.report import HtmlReport
 from importlib import import_module
 
 import argparse
 import logging
 import pkg_resources
 import sys
+import time
 
 
 logging.basicConfig(level=logging.DEBUG, stream=sys.stdout, format="%(message)s")
@@ -28,7 +43,61 @@ def is_development_package(package):
     return "/src/" in package.location
 
 
-def run():
+def log_obsolete(declarations, eggs_folder):
+    """Log the overrides that can be deleted and the declarations that only need a version bump."""
+    results = find_obsolete(declarations, eggs_folder, logger)
+    messages = {
+        OBSOLETE_IDENTICAL: "The override {local_path} in package {local_package} is identical to {path} of {package} {current_version} and can be deleted.",
+        OBSOLETE_WHITESPACE: "The override {local_path} in package {local_package} differs only in whitespace from {path} of {package} {current_version} and can be deleted.",
+        OBSOLETE_VERSION: "The vanilla file {path} of {package} did not change since version {version}. The declaration of {local_path} in package {local_package} only needs a version bump to {current_version}.",
+    }
+    for declaration, reason in results:
+        logger.info(
+            messages[reason].format(
+                local_path=declaration.local_path,
+                local_package=declaration.local_package,
+                path=declaration.path,
+                package=declaration.package,
+                version=str(declaration.version),
+                current_version=declaration.distribution.version,
+            )
+        )
+    logger.info(
+        "{obsolete} of {total} overrides can be deleted, {bumps} declarations only need a version bump.".format(
+            obsolete=len([1 for _, reason in results if reason != OBSOLETE_VERSION]),
+            total=len(declarations),
+            bumps=len([1 for _, reason in results if reason == OBSOLETE_VERSION]),
+        )
+    )
+
+
+def get_limits(options, deadline=None):
+    """Get the limits for checking a single declaration.
+
+    :param options: parsed command line options
+    :type options: argparse.Namespace
+    :param deadline: end of the global time budget
+    :type deadline: float
+    :return: limits
+    :rtype: collective.patchwatcher.process.Limits
+    """
+    timeout = options.timeout
+    if deadline is not None:
+        remaining = max(deadline - time.time(), 0)
+        timeout = remaining if timeout is None else min(timeout, remaining)
+    return Limits(
+        timeout=timeout, cpu_time=options.cpu_limit, memory=options.memory_limit
+    )
+
+
+def parse_arguments(args):
+    """Parse the command line options.
+
+    :param args: command line arguments
+    :type args: list
+    :return: parsed options
+    :rtype: argparse.Namespace
+    """
     arg_parser = argparse.ArgumentParser(
         description="script for checking if there are changes"
     )
@@ -56,13 +125,104 @@ def run():
         help="show the difference in the files between old version and the current version (needs both to be present in eggs folder)",
         action="store_true",
     )
-    options = arg_parser.parse_args(sys.argv[1:])
+    arg_parser.add_argument(
+        "--html-report",
+        metavar="DIR",
+        help="write a static HTML report with the status and diffs of all declarations into DIR",
+    )
+    arg_parser.add_argument(
+        "--timeout",
+        type=float,
+        metavar="SECONDS",
+        help="time budget for checking a single declaration, exceeding declarations are reported as timed out",
+    )
+    arg_parser.add_argument(
+        "--total-timeout",
+        type=float,
+        metavar="SECONDS",
+        help="time budget for checking all declarations",
+    )
+    arg_parser.add_argument(
+        "--cpu-limit",
+        type=int,
+        metavar="SECONDS",
+        help="CPU time limit for every call of diff and diff3",
+    )
+    arg_parser.add_argument(
+        "--memory-limit",
+        type=int,
+        metavar="MB",
+        help="memory limit for every call of diff and diff3",
+    )
+    arg_parser.add_argument(
+        "--find-obsolete",
+        help="only list the overrides that are identical to the current version and the declarations that only need a version bump",
+        action="store_true",
+    )
+    arg_parser.add_argument(
+        "-b",
+        "--batch",
+        help="compare the vanilla files with a single diff per package and pair of versions instead of one diff per declaration",
+        action="store_true",
+    )
+    arg_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of declarations checked in parallel",
+    )
+    arg_parser.add_argument(
+        "--history",
+        metavar="FILE",
+        default="",
+        help="file for the durations and results of previous runs, which are used to check the failed and slowest declarations first (e.g. .patchwatcher-history.json)",
+    )
+    arg_parser.add_argument(
+        "-c",
+        "--chain",
+        help="merge the changes release by release using all versions in the eggs folder and stop at the first release causing conflicts",
+        action="store_true",
+    )
+    arg_parser.add_argument(
+        "--merge-cache",
+        metavar="DIR",
+        default=".patchwatcher-cache",
+        help="folder for memoizing the intermediate results of chained merges (default: %(default)s, empty for no persistence)",
+    )
+    arg_parser.add_argument(
+        "--blame-versions",
+        help="find the first release, in which the vanilla file of a changed declaration differs from the declared version (binary search over the versions in the eggs folder)",
+        action="store_true",
+    )
+    arg_parser.add_argument(
+        "--index-url",
+        metavar="URL",
+        help="simple package index (PEP 503) for fetching the old vanilla files, which are not in the eggs folder",
+    )
+    arg_parser.add_argument(
+        "--index-folder",
+        metavar="DIR",
+        default=".patchwatcher-index",
+        help="folder for the files fetched from the package index (default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "--index-jobs",
+        type=int,
+        default=8,
+        help="number of files fetched from the package index in parallel (default: %(default)s)",
+    )
+    return arg_parser.parse_args(args)
 
-    diff_options = {
-        k.replace("diff_", ""): v
-        for (k, v) in vars(options).items()
-        if k.startswith("diff_")
-    }
+
+def collect_declarations(options):
+    """Collect the declarations of the given packages (or all development packages).
+
+    :param options: parsed command line options
+    :type options: argparse.Namespace
+    :return: list of tuples of package and its declarations
+    :rtype: list
+    """
     if options.packages:
         packages = [package.strip() for package in options.packages.split(",")]
     else:
@@ -73,8 +233,7 @@ def run():
             if is_development_package(package)
         ]
 
-    all_ok = True
-
+    package_declarations = []
     for package in packages:
         distribution = get_distribution(package)
         if not distribution:
@@ -88,16 +247,79 @@ def run():
                 "Could not import {}.overrides_info.declarations".format(package)
             )
             continue
+        package_declarations.append((package, declarations))
+    return package_declarations
 
-        ok = True
 
+def get_eggs_folder(options, declarations):
+    """Get the eggs folder, fetching the missing old vanilla files from the package index first.
+
+    :param options: parsed command line options
+    :type options: argparse.Namespace
+    :param declarations: declarations
+    :type declarations: list
+    :return: location of the eggs folder or list of locations
+    :rtype: str
+    """
+    if not options.index_url:
+        return options.eggs_folder
+    source = SimpleIndexSource(options.index_url, options.index_folder)
+    eggs_folder = [options.eggs_folder, options.index_folder]
+    fetched = fetch_missing(source, declarations, eggs_folder, logger, options.index_jobs)
+    source.pool.close()
+    logger.info("Fetched {} vanilla files from {}".format(fetched, options.index_url))
+    return eggs_folder
+
+
+def check_declarations(declarations, check, jobs=1):
+    """Check the declarations sequentially or in a thread pool.
+
+    :param declarations: declarations in the scheduled order
+    :type declarations: list
+    :param check: function checking a single declaration
+    :type check: function
+    :param jobs: number of declarations checked in parallel
+    :type jobs: int
+    :return: mapping of declarations to the results of the checks
+    :rtype: dict
+    """
+    if jobs <= 1:
+        return {declaration: check(declaration) for declaration in declarations}
+    from concurrent.futures import as_completed
+    from concurrent.futures import ThreadPoolExecutor
+
+    executor = ThreadPoolExecutor(max_workers=jobs)
+    futures = {}
+    try:
+        # the executor takes the declarations in the scheduled order
         for declaration in declarations:
-            check = declaration.check(
-                logger, options.eggs_folder, options.write, diff_options
-            )
-            ok &= check
+            futures[executor.submit(check, declaration)] = declaration
+        return {futures[future]: future.result() for future in as_completed(futures)}
+    finally:
+        # after an interruption the pending checks are not started anymore
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def log_summary(package_declarations, results, write):
+    """Log the results per package and the versions to be declared.
+
+    :param package_declarations: list of tuples of package and its declarations
+    :type package_declarations: list
+    :param results: mapping of declarations to the results of the checks
+    :type results: dict
+    :param write: True if the merge results were written
+    :type write: boolean
+    :return: True, if all declarations are fine
+    :rtype: boolean
+    """
+    all_ok = True
+
+    for package, declarations in package_declarations:
+        ok = all(results[declaration] for declaration in declarations)
         if ok:
-            if options.write:
+            if write:
                 logger.info(
                     "No conflicts detected for all declarations of package {}.".format(
                         package
@@ -111,7 +333,7 @@ def run():
                 )
         else:
             logger.warn("The package {} needs further inspection.".format(package))
-        if options.write or True:
+        if write or True:
             summary_packages = sorted(set([(declaration.package, str(declaration.distribution.version)) for declaration in declarations]))
             # Print the chosen versions conveniently
             print(
@@ -130,9 +352,98 @@ def run():
                 + "-" * 120
             )
 
-        all_ok &= all_ok
+        all_ok &= ok
+    return all_ok
+
+
+def run():
+    options = parse_arguments(sys.argv[1:])
+
+    diff_options = {
+        k.replace("diff_", ""): v
+        for (k, v) in vars(options).items()
+        if k.startswith("diff_")
+    }
+    package_declarations = collect_declarations(options)
+    all_declarations = [
+        declaration
+        for _, declarations in package_declarations
+        for declaration in declarations
+    ]
+    eggs_folder = get_eggs_folder(options, all_declarations)
+
+    if options.find_obsolete:
+        log_obsolete(all_declarations, eggs_folder)
+        sys.exit(0)
+
+    history = History(options.history) if options.history else None
+    if history:
+        all_declarations = schedule(all_declarations, history)
+
+    report = HtmlReport(options.html_report) if options.html_report else None
+    progress = Progress(len(all_declarations))
+    deadline = (
+        time.time() + options.total_timeout if options.total_timeout is not None else None
+    )
+    old_current_diffs = {}
+    chain = MergeChain(options.merge_cache or None) if options.chain else None
+
+    def check(declaration):
+        started = time.time()
+        ok = declaration.check(
+            logger,
+            eggs_folder,
+            options.write,
+            diff_options,
+            report,
+            get_limits(options, deadline),
+            old_current_diffs.pop(declaration, None),
+            chain,
+            options.blame_versions,
+        )
+        if history:
+            history.record(declaration, time.time() - started)
+        progress.update()
+        logger.info(str(progress))
+        return ok
+
+    try:
+        if options.batch:
+            old_current_diffs = batch_diff(
+                all_declarations,
+                eggs_folder,
+                logger,
+                colorful=True,
+                limits=Limits(
+                    timeout=deadline - time.time() if deadline is not None else None,
+                    cpu_time=options.cpu_limit,
+                    memory=options.memory_limit,
+                ),
+            )
+        results = check_declarations(all_declarations, check, options.jobs)
+    except KeyboardInterrupt:
+        # running checks stop at their next external tool
+        killed = kill_all()
+        logger.error(
+            "Interrupted after checking {} of {} declarations ({} running processes killed).".format(
+                progress.done, progress.total, killed
+            )
+        )
+        if report:
+            report.close()
+        if history:
+            history.save()
+        sys.exit(130)
+
+    all_ok = log_summary(package_declarations, results, options.write)
+
+    if report:
+        report.close()
+        logger.info("HTML report written into {}".format(options.html_report))
+    if history:
+        history.save()
 
-    sys.exit(int(all_ok))
+    sys.exit(int(not all_ok))
 
 
 if __name__ == "__main__":
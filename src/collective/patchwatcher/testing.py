@@ -1,51 +1,127 @@
 # -*- coding: utf-8 -*-
-from plone.app.contenttypes.testing import PLONE_APP_CONTENTTYPES_FIXTURE
-from plone.app.robotframework.testing import REMOTE_LIBRARY_BUNDLE_FIXTURE
-from plone.app.testing import applyProfile
-from plone.app.testing import FunctionalTesting
-from plone.app.testing import IntegrationTesting
-from plone.app.testing import PloneSandboxLayer
-from plone.testing import z2
+from collective.patchwatcher import Declaration
+from collective.patchwatcher import get_egg_locations
+from collective.patchwatcher.manifest import hash_data
 
 import collective.patchwatcher
+import os
+import pkg_resources
 
 
-class CollectivePatchwatcherLayer(PloneSandboxLayer):
+def make_egg(eggs_folder, project_name, version, files, record=False):
+    """Create a distribution in an eggs folder.
 
-    defaultBases = (PLONE_APP_CONTENTTYPES_FIXTURE,)
+    :param eggs_folder: eggs folder
+    :type eggs_folder: str
+    :param project_name: name of the project
+    :type project_name: str
+    :param version: version of the distribution
+    :type version: str
+    :param files: mapping of paths (with slashes) to contents, None only creates the folder of the file
+    :type files: dict
+    :param record: write a ``RECORD`` with the hashes of the files
+    :type record: bool
+    :return: location of the distribution
+    :rtype: str
+    """
+    location = os.path.join(
+        eggs_folder, "{}-{}-py3.egg".format(project_name, version)
+    )
+    for path, data in files.items():
+        path = os.path.join(location, *path.split("/"))
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        if data is not None:
+            with open(path, "wb") as file:
+                file.write(data)
+    if record:
+        os.makedirs(os.path.join(location, "EGG-INFO"))
+        with open(os.path.join(location, "EGG-INFO", "RECORD"), "w") as file:
+            for path, data in files.items():
+                if data is not None:
+                    file.write("{},{},{}\n".format(path, hash_data(data), len(data)))
+            file.write("EGG-INFO/RECORD,,\n")
+    return location
 
-    def setUpZope(self, app, configurationContext):
-        # Load any other ZCML that is required for your tests.
-        # The z3c.autoinclude feature is disabled in the Plone fixture base
-        # layer.
-        import plone.restapi
-        self.loadZCML(package=plone.restapi)
-        self.loadZCML(package=collective.patchwatcher)
 
-    def setUpPloneSite(self, portal):
-        applyProfile(portal, 'collective.patchwatcher:default')
+def make_declaration(eggs_folder, project_name, version, current_version, path):
+    """Create a declaration of a vanilla file in an eggs folder.
 
+    The distributions are not installed, so the declaration is created
+    without looking up the current distribution with ``pkg_resources``.
 
-COLLECTIVE_PATCHWATCHER_FIXTURE = CollectivePatchwatcherLayer()
+    :param eggs_folder: eggs folder with the distributions (see make_egg)
+    :type eggs_folder: str
+    :param project_name: name of the project
+    :type project_name: str
+    :param version: declared version
+    :type version: str
+    :param current_version: version of the current distribution
+    :type current_version: str
+    :param path: path of the vanilla file (with slashes)
+    :type path: str
+    :return: declaration
+    :rtype: collective.patchwatcher.Declaration
+    """
+    declaration = Declaration.__new__(Declaration)
+    declaration.package = project_name
+    declaration.version = pkg_resources.parse_version(version)
+    declaration.distribution = pkg_resources.Distribution(
+        location=get_egg_locations(eggs_folder, project_name)[current_version],
+        project_name=project_name,
+        version=current_version,
+    )
+    declaration.distribution_path = os.path.join(*path.split("/"))
+    declaration.status = None
+    declaration.changed_version = None
+    return declaration
 
 
-COLLECTIVE_PATCHWATCHER_INTEGRATION_TESTING = IntegrationTesting(
-    bases=(COLLECTIVE_PATCHWATCHER_FIXTURE,),
-    name='CollectivePatchwatcherLayer:IntegrationTesting',
-)
+try:
+    from plone.app.contenttypes.testing import PLONE_APP_CONTENTTYPES_FIXTURE
+    from plone.app.robotframework.testing import REMOTE_LIBRARY_BUNDLE_FIXTURE
+    from plone.app.testing import applyProfile
+    from plone.app.testing import FunctionalTesting
+    from plone.app.testing import IntegrationTesting
+    from plone.app.testing import PloneSandboxLayer
+    from plone.testing import z2
+except ImportError:  # the helpers above are used without the Plone test extra
+    PloneSandboxLayer = None
 
 
-COLLECTIVE_PATCHWATCHER_FUNCTIONAL_TESTING = FunctionalTesting(
-    bases=(COLLECTIVE_PATCHWATCHER_FIXTURE,),
-    name='CollectivePatchwatcherLayer:FunctionalTesting',
-)
+if PloneSandboxLayer is not None:
+    class CollectivePatchwatcherLayer(PloneSandboxLayer):
 
+        defaultBases = (PLONE_APP_CONTENTTYPES_FIXTURE,)
 
-COLLECTIVE_PATCHWATCHER_ACCEPTANCE_TESTING = FunctionalTesting(
-    bases=(
-        COLLECTIVE_PATCHWATCHER_FIXTURE,
-        REMOTE_LIBRARY_BUNDLE_FIXTURE,
-        z2.ZSERVER_FIXTURE,
-    ),
-    name='CollectivePatchwatcherLayer:AcceptanceTesting',
-)
+        def setUpZope(self, app, configurationContext):
+            # Load any other ZCML that is required for your tests.
+            # The z3c.autoinclude feature is disabled in the Plone fixture base
+            # layer.
+            import plone.restapi
+            self.loadZCML(package=plone.restapi)
+            self.loadZCML(package=collective.patchwatcher)
+
+        def setUpPloneSite(self, portal):
+            applyProfile(portal, 'collective.patchwatcher:default')
+
+    COLLECTIVE_PATCHWATCHER_FIXTURE = CollectivePatchwatcherLayer()
+
+    COLLECTIVE_PATCHWATCHER_INTEGRATION_TESTING = IntegrationTesting(
+        bases=(COLLECTIVE_PATCHWATCHER_FIXTURE,),
+        name='CollectivePatchwatcherLayer:IntegrationTesting',
+    )
+
+    COLLECTIVE_PATCHWATCHER_FUNCTIONAL_TESTING = FunctionalTesting(
+        bases=(COLLECTIVE_PATCHWATCHER_FIXTURE,),
+        name='CollectivePatchwatcherLayer:FunctionalTesting',
+    )
+
+    COLLECTIVE_PATCHWATCHER_ACCEPTANCE_TESTING = FunctionalTesting(
+        bases=(
+            COLLECTIVE_PATCHWATCHER_FIXTURE,
+            REMOTE_LIBRARY_BUNDLE_FIXTURE,
+            z2.ZSERVER_FIXTURE,
+        ),
+        name='CollectivePatchwatcherLayer:AcceptanceTesting',
+    )
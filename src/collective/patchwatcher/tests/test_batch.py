@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""Tests for the batched diffs."""
+from collective.patchwatcher.batch import batch_diff
+from collective.patchwatcher.batch import diff_group
+from collective.patchwatcher.batch import split_diff
+from collective.patchwatcher.testing import make_declaration
+from collective.patchwatcher.testing import make_egg
+
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+
+OUTPUT = u"""diff -r -p a/my/package/a.pt b/my/package/a.pt
+*** a/my/package/a.pt
+--- b/my/package/a.pt
+***************
+*** 1 ****
+! a
+--- 1 ----
+! A
+diff -r -p '--color=always' a/my/package/sub/b.pt b/my/package/sub/b.pt
+*** a/my/package/sub/b.pt
+--- b/my/package/sub/b.pt
+"""
+
+
+class DummyDeclaration(object):
+    def __init__(self, directory, path, old, new):
+        self.distribution_path = path
+        self.current_file_path = os.path.join(directory, "current", path)
+        self.write(os.path.join(directory, "previous", path), old)
+        self.write(self.current_file_path, new)
+
+    def write(self, path, data):
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "wb") as file:
+            file.write(data)
+
+    def get_previous_file(self, previous_location):
+        return os.path.join(previous_location, self.distribution_path)
+
+
+class TestSplitDiff(unittest.TestCase):
+    def test_split_diff(self):
+        diffs = split_diff(
+            OUTPUT, ["my/package/a.pt", "my/package/sub/b.pt", "my/package/c.pt"]
+        )
+        self.assertEqual(sorted(diffs), ["my/package/a.pt", "my/package/sub/b.pt"])
+        self.assertTrue(diffs["my/package/a.pt"].startswith(u"*** a/my/package/a.pt\n"))
+        self.assertTrue(diffs["my/package/a.pt"].endswith(u"! A\n"))
+        self.assertEqual(
+            diffs["my/package/sub/b.pt"],
+            u"*** a/my/package/sub/b.pt\n--- b/my/package/sub/b.pt\n",
+        )
+
+    def test_split_quoted_headers(self):
+        output = u'diff -r -p "a/my/my view.pt" "b/my/my view.pt"\n*** a/my/my view.pt\n'
+        self.assertEqual(
+            split_diff(output, ["my/my view.pt"]),
+            {"my/my view.pt": u"*** a/my/my view.pt\n"},
+        )
+
+
+class TestDiffGroup(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_diff_group(self):
+        changed = DummyDeclaration(self.directory, "my/view.pt", b"a\n", b"A\n")
+        spaced = DummyDeclaration(self.directory, "my/my view.pt", b"b\n", b"B\n")
+        # claimed to be changed, but identical: no diff can be attributed
+        identical = DummyDeclaration(self.directory, "my/same.pt", b"c\n", b"c\n")
+        results = diff_group(
+            [changed, spaced, identical],
+            os.path.join(self.directory, "previous"),
+            colorful=True,
+        )
+        self.assertEqual(sorted(results, key=id), sorted([changed, spaced], key=id))
+        for declaration, new in ((changed, u"A"), (spaced, u"B")):
+            output, rc = results[declaration]
+            self.assertEqual(rc, 1)
+            self.assertIn(new, output)
+
+
+class TestBatchDiff(unittest.TestCase):
+    def setUp(self):
+        self.eggs_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.eggs_folder)
+
+    def test_unchanged_files_are_omitted(self):
+        make_egg(
+            self.eggs_folder,
+            "demopkg",
+            "1.0",
+            {"demopkg/changed.pt": b"a\n", "demopkg/same.pt": b"b\n"},
+            record=True,
+        )
+        location = make_egg(
+            self.eggs_folder,
+            "demopkg",
+            "1.1",
+            {"demopkg/changed.pt": b"A\n", "demopkg/same.pt": b"b\n"},
+            record=True,
+        )
+        declarations = []
+        for path in ("demopkg/changed.pt", "demopkg/same.pt"):
+            declaration = make_declaration(self.eggs_folder, "demopkg", "1.0", "1.1", path)
+            declaration.current_file_path = os.path.join(location, *path.split("/"))
+            declarations.append(declaration)
+        results = batch_diff(declarations, self.eggs_folder, logging.getLogger())
+        self.assertEqual(list(results), declarations[:1])
+        self.assertEqual(results[declarations[0]][1], 1)
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""Tests for finding the release, which changed a vanilla file."""
+from collective.patchwatcher.testing import make_declaration
+from collective.patchwatcher.testing import make_egg
+
+import shutil
+import tempfile
+import unittest
+
+
+class TestFindChangedVersion(unittest.TestCase):
+    def setUp(self):
+        self.eggs_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.eggs_folder)
+
+    def make_declaration(self, changed_in, versions=20):
+        locations = {}
+        for minor in range(versions):
+            version = "1.{}".format(minor)
+            locations[version] = make_egg(
+                self.eggs_folder,
+                "demopkg",
+                version,
+                {"demopkg/view.pt": b"changed\n" if minor >= changed_in else b"vanilla\n"},
+            )
+        declaration = make_declaration(
+            self.eggs_folder, "demopkg", "1.0", "1.{}".format(versions - 1), "demopkg/view.pt"
+        )
+        return declaration, locations["1.0"]
+
+    def test_binary_search(self):
+        declaration, previous_location = self.make_declaration(changed_in=13)
+        compared = []
+        changed_between = declaration.changed_between
+
+        def counting_changed_between(location, other_location):
+            compared.append(other_location)
+            return changed_between(location, other_location)
+
+        declaration.changed_between = counting_changed_between
+        self.assertEqual(
+            declaration.find_changed_version(self.eggs_folder, previous_location),
+            ("1.13", len(compared)),
+        )
+        # 19 candidates need at most 5 comparisons
+        self.assertLessEqual(len(compared), 5)
+
+    def test_changed_in_current_version(self):
+        declaration, previous_location = self.make_declaration(changed_in=4, versions=5)
+        self.assertEqual(
+            declaration.find_changed_version(self.eggs_folder, previous_location)[0],
+            "1.4",
+        )
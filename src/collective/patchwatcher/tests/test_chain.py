@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""Tests for the chained merges."""
+from collective.patchwatcher.chain import MergeChain
+from collective.patchwatcher.manifest import hash_data
+from collective.patchwatcher.testing import make_declaration
+from collective.patchwatcher.testing import make_egg
+
+import os
+import shutil
+import tempfile
+import unittest
+
+
+VANILLA = b"1\n2\n3\n4\n5\n6\n7\n8\n9\n"
+
+
+class TestMergeChain(unittest.TestCase):
+    def test_memoized_results_are_persisted(self):
+        cache_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_folder)
+        key = hash_data(b"inputs")
+        chain = MergeChain(cache_folder)
+        self.assertIsNone(chain.get(key))
+        chain.set(key, u"merged\n", 0)
+        self.assertEqual(chain.get(key), (u"merged\n", 0))
+        # another run reuses the result
+        self.assertEqual(MergeChain(cache_folder).get(key), (u"merged\n", 0))
+        self.assertIsNone(MergeChain().get(key))
+
+
+class TestMerge(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.eggs_folder = os.path.join(self.directory, "eggs")
+
+    def make_declaration(self, releases):
+        """Create a declaration of view.pt based on version 1.0 with a local change of the last line.
+
+        :param releases: list of tuples of version and vanilla file (None, if missing)
+        """
+        locations = {}
+        for version, content in releases:
+            locations[version] = make_egg(
+                self.eggs_folder, "demopkg", version, {"demopkg/view.pt": content}
+            )
+        declaration = make_declaration(
+            self.eggs_folder, "demopkg", "1.0", releases[-1][0], "demopkg/view.pt"
+        )
+        declaration.local_file_path = os.path.join(self.directory, "view.pt")
+        with open(declaration.local_file_path, "wb") as file:
+            file.write(VANILLA.replace(b"9", b"local"))
+        return declaration, locations["1.0"]
+
+    def merge(self, releases):
+        declaration, previous_location = self.make_declaration(releases)
+        return MergeChain().merge(declaration, self.eggs_folder, previous_location)
+
+    def test_release_by_release(self):
+        first = VANILLA.replace(b"1\n", b"first\n")
+        second = first.replace(b"5\n", b"second\n")
+        result, rc, conflict_version = self.merge(
+            [("1.0", VANILLA), ("1.1", first), ("1.2", first), ("1.3", second)]
+        )
+        self.assertEqual((rc, conflict_version), (0, None))
+        self.assertEqual(result, second.replace(b"9", b"local").decode("utf8"))
+
+    def test_stop_at_conflict(self):
+        conflicting = VANILLA.replace(b"9", b"upstream")
+        result, rc, conflict_version = self.merge(
+            [
+                ("1.0", VANILLA),
+                ("1.1", VANILLA.replace(b"1\n", b"first\n")),
+                ("1.2", conflicting),
+                ("1.3", conflicting.replace(b"5\n", b"later\n")),
+            ]
+        )
+        self.assertEqual((rc, conflict_version), (1, "1.2"))
+        self.assertIn(u"<<<<<<< ", result)
+        self.assertNotIn(u"later", result)
+
+    def test_missing_intermediate_file(self):
+        current = VANILLA.replace(b"1\n", b"first\n")
+        result, rc, conflict_version = self.merge(
+            [("1.0", VANILLA), ("1.1", None), ("1.2", current)]
+        )
+        self.assertEqual((rc, conflict_version), (0, None))
+        self.assertEqual(result, current.replace(b"9", b"local").decode("utf8"))
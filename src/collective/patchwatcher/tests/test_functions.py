@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Tests for extracting single functions and classes."""
+from collective.patchwatcher.functions import find_module
+from collective.patchwatcher.functions import get_fragment
+from collective.patchwatcher.functions import replace_fragment
+
+import ast
+import os
+import shutil
+import tempfile
+import unittest
+
+
+SOURCE = u'''import os
+
+
+class View(object):
+    def other(self):
+        return 1
+
+    @property
+    def render(self):
+        return os.sep
+
+
+@decorate(
+    name="other",
+)
+def function():
+    return 3
+'''
+
+
+class TestFunctions(unittest.TestCase):
+    def setUp(self):
+        self.lines = SOURCE.splitlines(True)
+        self.tree = ast.parse(SOURCE)
+
+    def test_find_module(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        os.makedirs(os.path.join(location, "my", "package", "browser"))
+        open(os.path.join(location, "my", "package", "browser", "views.py"), "w").close()
+        self.assertEqual(
+            find_module(location, "my.package.browser.views.View.render"),
+            (os.path.join("my", "package", "browser", "views.py"), "View.render"),
+        )
+        with self.assertRaises(LookupError):
+            find_module(location, "my.package.missing.View")
+
+    def test_get_fragment(self):
+        self.assertEqual(
+            get_fragment(self.lines, self.tree, "View.render"),
+            u"@property\ndef render(self):\n    return os.sep\n",
+        )
+        self.assertIsNone(get_fragment(self.lines, self.tree, "View.missing"))
+
+    def test_get_fragment_with_multiline_decorator(self):
+        self.assertEqual(
+            get_fragment(self.lines, self.tree, "function"),
+            u'@decorate(\n    name="other",\n)\ndef function():\n    return 3\n',
+        )
+
+    def test_replace_fragment(self):
+        source = replace_fragment(
+            self.lines, self.tree, "View.other", u"def other(self):\n    return 2\n"
+        )
+        self.assertIn(u"    def other(self):\n        return 2\n\n    @property", source)
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""Tests for the history based scheduling."""
+from collective.patchwatcher.history import History
+from collective.patchwatcher.history import schedule
+
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class DummyDeclaration(object):
+    def __init__(self, directory, name, size):
+        self.name = name
+        self.status = None
+        self.local_file_path = os.path.join(directory, name)
+        self.current_file_path = os.path.join(directory, "missing")
+        with open(self.local_file_path, "wb") as file:
+            file.write(b"x" * size)
+
+    def get_id(self):
+        return self.name
+
+
+class TestHistory(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "history.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_schedule(self):
+        small = DummyDeclaration(self.directory, "small", 10)
+        large = DummyDeclaration(self.directory, "large", 1000)
+        slow = DummyDeclaration(self.directory, "slow", 10000)
+        failed = DummyDeclaration(self.directory, "failed", 1)
+        # unknown declarations are estimated by their size
+        self.assertEqual(
+            schedule([small, large], History(self.path)), [large, small]
+        )
+
+        history = History(self.path)
+        history.record(slow, 60)
+        failed.status = "conflict"
+        history.record(failed, 0.1)
+        history.save()
+        self.assertEqual(
+            schedule([small, large, slow, failed], History(self.path)),
+            [failed, slow, large, small],
+        )
+
+    def test_bounded_and_shared(self):
+        first = History(self.path, max_entries=2)
+        second = History(self.path, max_entries=2)
+        for name in ("a", "b"):
+            first.record(DummyDeclaration(self.directory, name, 1), 1)
+        second.record(DummyDeclaration(self.directory, "c", 1), 1)
+        first.save()
+        second.save()
+        entries = History(self.path).entries
+        self.assertEqual(len(entries), 2)
+        self.assertIn(
+            second.get_key(DummyDeclaration(self.directory, "c", 1)), entries
+        )
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""Tests for fetching vanilla files from a package index."""
+from collective.patchwatcher import get_egg_locations
+from collective.patchwatcher.index import fetch_missing
+from collective.patchwatcher.index import SimpleIndexSource
+from collective.patchwatcher.manifest import get_manifest
+from collective.patchwatcher.manifest import hash_data
+
+import base64
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import zipfile
+
+
+try:
+    from http.server import HTTPServer
+    from http.server import SimpleHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+except ImportError:  # py2 compatibility
+    from BaseHTTPServer import HTTPServer
+    from SimpleHTTPServer import SimpleHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+
+
+VANILLA = b"def view():\n    return 'vanilla'\n"
+FILES = ("views.py", "forms.py", "utils.py")
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """Static files with persistent connections and (optional) range requests."""
+
+    protocol_version = "HTTP/1.1"
+    support_ranges = True
+    served = []
+    # seconds each request takes, for observing concurrent requests
+    delay = 0
+    active = []
+    max_active = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            self.active.append(self)
+            RangeRequestHandler.max_active = max(self.max_active, len(self.active))
+        try:
+            time.sleep(self.delay)
+            self.send_file()
+        finally:
+            with self.lock:
+                self.active.remove(self)
+
+    def send_file(self):
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            path = os.path.join(path, "index.html")
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        with open(path, "rb") as file:
+            data = file.read()
+        match = re.match(r"bytes=(\d*)-(\d*)$", self.headers.get("Range", ""))
+        if match and self.support_ranges:
+            start, end = match.groups()
+            if not start:
+                start, end = max(len(data) - int(end), 0), len(data) - 1
+            else:
+                start, end = int(start), min(int(end or len(data) - 1), len(data) - 1)
+            body = data[start : end + 1]
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", "bytes {}-{}/{}".format(start, end, len(data))
+            )
+        else:
+            body = data
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.served.append((self.path, len(body)))
+
+    def translate_path(self, path):
+        return os.path.join(self.server.root, path.split("?", 1)[0].lstrip("/"))
+
+    def log_message(self, *args):
+        pass
+
+
+class DummyDeclaration(object):
+    package = "demo.pkg"
+
+    def __init__(self, version="1.0", path="views.py"):
+        self.version = version
+        self.path = path
+        self.distribution_path = os.path.join("demo", "pkg", path)
+
+    def is_latest(self):
+        return False
+
+    def get_previous_location(self, eggs_folder):
+        return get_egg_locations(eggs_folder, self.package, self.distribution_path).get(
+            self.version
+        )
+
+
+class TestSimpleIndexSource(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.root = os.path.join(self.directory, "root")
+        os.makedirs(os.path.join(self.root, "simple", "demo-pkg"))
+        os.makedirs(os.path.join(self.root, "packages"))
+        self.wheel_size = self.make_wheel("1.0")
+        self.make_wheel("1.1")
+        with open(os.path.join(self.root, "simple", "demo-pkg", "index.html"), "w") as file:
+            file.write(
+                '<html><body><a href="../../packages/demo_pkg-1.0-py3-none-any.whl#sha256=x">'
+                'demo_pkg-1.0-py3-none-any.whl</a><a href="../../packages/demo_pkg-1.1-py3-none-any.whl">'
+                "demo_pkg-1.1-py3-none-any.whl</a></body></html>"
+            )
+        RangeRequestHandler.served = []
+        RangeRequestHandler.support_ranges = True
+        RangeRequestHandler.delay = 0
+        RangeRequestHandler.max_active = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), RangeRequestHandler)
+        self.server.root = self.root
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.index_url = "http://127.0.0.1:{}/simple/".format(self.server.server_port)
+        self.folder = os.path.join(self.directory, "index")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def make_wheel(self, version):
+        path = os.path.join(
+            self.root, "packages", "demo_pkg-{}-py3-none-any.whl".format(version)
+        )
+        record = "".join(
+            "demo/pkg/{},{},{}\n".format(name, hash_data(VANILLA), len(VANILLA))
+            for name in FILES
+        )
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as wheel:
+            for name in FILES:
+                wheel.writestr("demo/pkg/" + name, VANILLA)
+            # large members, which should not be downloaded
+            wheel.writestr("demo/pkg/big.bin", base64.b64encode(os.urandom(300000)))
+            wheel.writestr("demo_pkg-{}.dist-info/RECORD".format(version), record)
+        return os.path.getsize(path)
+
+    def test_fetch_with_ranges(self):
+        source = SimpleIndexSource(self.index_url, self.folder)
+        location = source.fetch("demo.pkg", "1.0", os.path.join("demo", "pkg", "views.py"))
+        with open(os.path.join(location, "demo", "pkg", "views.py"), "rb") as file:
+            self.assertEqual(file.read(), VANILLA)
+        self.assertEqual(
+            get_manifest(location, "demo.pkg").get(os.path.join("demo", "pkg", "views.py")),
+            hash_data(VANILLA),
+        )
+        self.assertEqual(get_egg_locations([self.folder], "demo.pkg"), {"1.0": location})
+        wheel_bytes = sum(
+            size for path, size in RangeRequestHandler.served if path.endswith(".whl")
+        )
+        self.assertLess(wheel_bytes, self.wheel_size / 2)
+        # a single pooled connection was used for all requests
+        self.assertEqual(source.pool.created, 1)
+        source.pool.close()
+
+    def test_fetch_without_ranges(self):
+        RangeRequestHandler.support_ranges = False
+        source = SimpleIndexSource(self.index_url, self.folder)
+        location = source.fetch("demo-pkg", "1.1", "demo/pkg/views.py")
+        with open(os.path.join(location, "demo", "pkg", "views.py"), "rb") as file:
+            self.assertEqual(file.read(), VANILLA)
+        # the whole wheel is downloaded once
+        self.assertEqual(
+            len([path for path, _size in RangeRequestHandler.served if path.endswith(".whl")]),
+            1,
+        )
+        source.pool.close()
+
+    def test_fetched_file_takes_precedence(self):
+        # the egg in the eggs folder lacks the vanilla file
+        eggs_folder = os.path.join(self.directory, "eggs")
+        egg = os.path.join(eggs_folder, "demo.pkg-1.0-py3.11.egg")
+        os.makedirs(os.path.join(egg, "demo", "pkg"))
+        declaration = DummyDeclaration()
+        source = SimpleIndexSource(self.index_url, self.folder)
+        eggs_folders = [eggs_folder, self.folder]
+        self.assertEqual(
+            fetch_missing(source, [declaration], eggs_folders, logging.getLogger(), 1), 1
+        )
+        source.pool.close()
+        self.assertEqual(
+            declaration.get_previous_location(eggs_folders),
+            source.get_location("demo.pkg", "1.0"),
+        )
+        # without the vanilla file in question the eggs folder wins
+        self.assertEqual(get_egg_locations(eggs_folders, "demo.pkg")["1.0"], egg)
+
+    def test_fetch_concurrently(self):
+        RangeRequestHandler.delay = 0.05
+        eggs_folder = os.path.join(self.directory, "eggs")
+        os.makedirs(eggs_folder)
+        declarations = [
+            DummyDeclaration(version, name) for version in ("1.0", "1.1") for name in FILES
+        ]
+        source = SimpleIndexSource(self.index_url, self.folder)
+        eggs_folders = [eggs_folder, self.folder]
+        self.assertEqual(
+            fetch_missing(source, declarations, eggs_folders, logging.getLogger(), 4), 6
+        )
+        source.pool.close()
+        for declaration in declarations:
+            location = declaration.get_previous_location(eggs_folders)
+            with open(os.path.join(location, declaration.distribution_path), "rb") as file:
+                self.assertEqual(file.read(), VANILLA)
+        self.assertGreater(RangeRequestHandler.max_active, 1)
+        # the index page and the central directory of a wheel are read only once per version
+        self.assertEqual(
+            len([path for path, _size in RangeRequestHandler.served if "/simple/" in path]),
+            2,
+        )
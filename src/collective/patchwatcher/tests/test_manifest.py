@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""Tests for the hash manifests."""
+from collective.patchwatcher.manifest import changed_files
+from collective.patchwatcher.manifest import file_changed
+from collective.patchwatcher.manifest import get_manifest
+from collective.patchwatcher.testing import make_egg
+
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestManifest(unittest.TestCase):
+    def setUp(self):
+        self.eggs_folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.eggs_folder)
+
+    def make_egg(self, version, files, record=True):
+        return make_egg(self.eggs_folder, "my.package", version, files, record)
+
+    def test_record_is_used_without_reading_files(self):
+        old = self.make_egg("1.0", {"my/package/a.pt": b"a", "my/package/b.pt": b"b"})
+        new = self.make_egg("1.1", {"my/package/a.pt": b"a", "my/package/b.pt": b"B"})
+        old_manifest = get_manifest(old, "my.package")
+        new_manifest = get_manifest(new, "my.package")
+        # removing the files proves that only the manifests are consulted
+        shutil.rmtree(os.path.join(old, "my"))
+        shutil.rmtree(os.path.join(new, "my"))
+        self.assertFalse(file_changed(old_manifest, new_manifest, "my/package/a.pt"))
+        self.assertTrue(file_changed(old_manifest, new_manifest, "./my/package/b.pt"))
+        self.assertEqual(changed_files(old_manifest, new_manifest), ["my/package/b.pt"])
+        self.assertEqual(
+            changed_files(old_manifest, new_manifest, [os.path.join("my", "package", "a.pt")]),
+            [],
+        )
+
+    def test_fallback_to_hashing(self):
+        old = self.make_egg("1.0", {"my/package/a.pt": b"a"}, record=False)
+        new = self.make_egg("1.1", {"my/package/a.pt": b"a", "my/package/c.pt": b"c"})
+        old_manifest = get_manifest(old, "my.package")
+        new_manifest = get_manifest(new, "my.package")
+        self.assertFalse(old_manifest.has_record)
+        self.assertFalse(file_changed(old_manifest, new_manifest, "my/package/a.pt"))
+        self.assertTrue(file_changed(old_manifest, new_manifest, "my/package/missing.pt"))
+        self.assertEqual(changed_files(old_manifest, new_manifest), ["my/package/c.pt"])
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""Tests for the detection of obsolete overrides."""
+from collective.patchwatcher.manifest import hash_data
+from collective.patchwatcher.obsolete import find_obsolete
+from collective.patchwatcher.obsolete import OBSOLETE_IDENTICAL
+from collective.patchwatcher.obsolete import OBSOLETE_VERSION
+from collective.patchwatcher.obsolete import OBSOLETE_WHITESPACE
+
+import logging
+import unittest
+
+
+logger = logging.getLogger("collective.patchwatcher")
+
+
+class DummyDeclaration(object):
+    def __init__(self, path, local_source, current_source, changed=True):
+        self.path = path
+        self.local_path = path
+        self.local_package = "my.package"
+        self.local_source = local_source
+        self.current_source = current_source
+        self.changed = changed
+
+    def get_local_source(self):
+        return self.local_source
+
+    def get_current_source(self):
+        return self.current_source
+
+    def get_current_hash(self):
+        return hash_data(self.current_source)
+
+    def is_latest(self):
+        return False
+
+    def get_previous_location(self, eggs_folder):
+        return eggs_folder
+
+    def has_changed(self, previous_location):
+        return self.changed
+
+
+class TestFindObsolete(unittest.TestCase):
+    def find(self, *declarations):
+        return [
+            (declarations.index(declaration), reason)
+            for declaration, reason in find_obsolete(declarations, "eggs", logger)
+        ]
+
+    def test_identical(self):
+        self.assertEqual(
+            self.find(DummyDeclaration("view.pt", b"<p>a</p>\n", b"<p>a</p>\n")),
+            [(0, OBSOLETE_IDENTICAL)],
+        )
+
+    def test_whitespace(self):
+        self.assertEqual(
+            self.find(
+                DummyDeclaration("view.pt", b"<p>\n  a</p>\n", b"<p> a</p>"),
+                DummyDeclaration("views.py", b"if x:\n    a()  \n\n", b"if x:\n    a()\n"),
+            ),
+            [(0, OBSOLETE_WHITESPACE), (1, OBSOLETE_WHITESPACE)],
+        )
+
+    def test_python_indentation_is_significant(self):
+        self.assertEqual(
+            self.find(
+                DummyDeclaration(
+                    "views.py", b"if x:\n    a()\n    b()\n", b"if x:\n    a()\nb()\n"
+                ),
+            ),
+            [],
+        )
+
+    def test_version(self):
+        self.assertEqual(
+            self.find(
+                DummyDeclaration("view.pt", b"local\n", b"vanilla\n", changed=False),
+                DummyDeclaration("other.pt", b"local\n", b"vanilla\n"),
+            ),
+            [(0, OBSOLETE_VERSION)],
+        )
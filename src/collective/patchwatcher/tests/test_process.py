@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""Tests for running the external tools."""
+from collective.patchwatcher import process
+from collective.patchwatcher.process import CommandCancelled
+from collective.patchwatcher.process import CommandTimeout
+from collective.patchwatcher.process import kill_all
+from collective.patchwatcher.process import Limits
+from collective.patchwatcher.process import run_command
+
+import threading
+import time
+import unittest
+
+
+class TestRunCommand(unittest.TestCase):
+    def test_output_and_return_code(self):
+        output, _err, rc = run_command(["sh", "-c", "echo patch; exit 1"])
+        self.assertEqual(output, b"patch\n")
+        self.assertEqual(rc, 1)
+
+    def test_timeout_kills_the_process(self):
+        started = time.time()
+        with self.assertRaises(CommandTimeout):
+            run_command(["sleep", "10"], Limits(timeout=0.2))
+        self.assertLess(time.time() - started, 5)
+
+    def test_exhausted_budget(self):
+        limits = Limits(timeout=0)
+        with self.assertRaises(CommandTimeout):
+            run_command(["true"], limits)
+
+    def test_cpu_limit(self):
+        _output, err, rc = run_command(
+            ["sh", "-c", "while :; do :; done"], Limits(timeout=10, cpu_time=1)
+        )
+        self.assertLess(rc, 0)
+        self.assertIn(b"terminated by signal", err)
+
+    def test_memory_limit(self):
+        output, _err, rc = run_command(
+            ["sh", "-c", "ulimit -v"], Limits(memory=100)
+        )
+        self.assertEqual((output, rc), (b"102400\n", 0))
+
+    def test_kill_all_cancels_the_run(self):
+        self.addCleanup(process._cancelled.clear)
+        errors = []
+
+        def run():
+            try:
+                run_command(["sleep", "10"])
+            except CommandCancelled as e:
+                errors.append(e)
+
+        started = time.time()
+        thread = threading.Thread(target=run)
+        thread.start()
+        while not process._processes:
+            time.sleep(0.01)
+        self.assertEqual(kill_all(), 1)
+        thread.join()
+        self.assertEqual(len(errors), 1)
+        # no new tools are started
+        with self.assertRaises(CommandCancelled):
+            run_command(["true"])
+        self.assertLess(time.time() - started, 5)
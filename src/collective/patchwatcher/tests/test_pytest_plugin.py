@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""Tests for the pytest plugin."""
+from collective.patchwatcher.testing import make_egg
+
+import collective.patchwatcher
+import os
+import shutil
+import tempfile
+import unittest
+
+
+try:
+    from collective.patchwatcher.pytest_plugin import read_declarations
+    from collective.patchwatcher.pytest_plugin import SUPPORTED
+except ImportError:  # pytest is not installed
+    read_declarations = None
+    SUPPORTED = False
+
+pytest_plugins = ["pytester"]
+
+
+OVERRIDES_INFO = b'''from collective.patchwatcher import DeclarationCollection
+from my.package import not_importable
+
+declarations = DeclarationCollection(local_package="my.package")
+
+declarations.add(
+    package="archetypes.querywidget",
+    version="1.1.2",
+    path="./skins/querywidget/querywidget.pt",
+    local_path="./overrides/querywidget.pt",
+)
+declarations.add_function(
+    "plone.app.contenttypes",
+    "2.1.7",
+    "plone.app.contenttypes.browser.folder.FolderView.results",
+    local_path="./patches.py",
+)
+declarations.add(package=not_importable, version="1.0", path="a", local_path="b")
+'''
+
+
+@unittest.skipIf(read_declarations is None, "pytest is not installed")
+class TestReadDeclarations(unittest.TestCase):
+    def test_read_declarations(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "overrides_info.py")
+        with open(path, "wb") as file:
+            file.write(OVERRIDES_INFO)
+        self.assertEqual(
+            read_declarations(path, "other.package"),
+            [
+                (
+                    6,
+                    "add",
+                    {
+                        "package": "archetypes.querywidget",
+                        "version": "1.1.2",
+                        "path": "./skins/querywidget/querywidget.pt",
+                        "local_path": "./overrides/querywidget.pt",
+                        "local_package": "my.package",
+                    },
+                ),
+                (
+                    12,
+                    "add_function",
+                    {
+                        "package": "plone.app.contenttypes",
+                        "version": "2.1.7",
+                        "name": "plone.app.contenttypes.browser.folder.FolderView.results",
+                        "local_path": "./patches.py",
+                        "local_package": "my.package",
+                    },
+                ),
+                (18, "add", None),
+            ],
+        )
+
+
+VANILLA = b"1\n2\n3\n4\n5\n6\n7\n8\n9\n"
+ADDON_OVERRIDES_INFO = b'''from collective.patchwatcher import DeclarationCollection
+
+declarations = DeclarationCollection(local_package="my_addon")
+declarations.add("vanillapkg", "1.0", "mergeable.pt", "overrides/mergeable.pt")
+declarations.add("vanillapkg", "1.0", "conflicting.pt", "overrides/conflicting.pt")
+declarations.add("vanillapkg", VERSION, "other.pt", "overrides/other.pt")
+'''
+
+
+def write(path, data):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, "wb") as file:
+        file.write(data)
+
+
+def make_addon(pytester, monkeypatch, request):
+    """Create an add-on overriding files of vanillapkg 1.0, which is installed as 1.1.
+
+    :return: function running pytest with the plugin in a subprocess
+    :rtype: function
+    """
+    site = str(pytester.path / "site")
+    eggs_folder = str(pytester.path / "eggs")
+    write(os.path.join(site, "my_addon", "__init__.py"), b"")
+    write(os.path.join(site, "my_addon", "overrides_info.py"), ADDON_OVERRIDES_INFO)
+    write(os.path.join(site, "my_addon.egg-info", "PKG-INFO"), b"Name: my_addon\nVersion: 1.0\n")
+    write(os.path.join(site, "vanillapkg", "__init__.py"), b"")
+    write(os.path.join(site, "vanillapkg.egg-info", "PKG-INFO"), b"Name: vanillapkg\nVersion: 1.1\n")
+    upstream = VANILLA.replace(b"1\n", b"upstream\n")
+    for name, local, current in (
+        ("mergeable", VANILLA.replace(b"9", b"local"), upstream),
+        ("conflicting", VANILLA.replace(b"1\n", b"local\n"), upstream),
+    ):
+        write(os.path.join(site, "my_addon", "overrides", name + ".pt"), local)
+        write(os.path.join(site, "vanillapkg", name + ".pt"), current)
+    make_egg(
+        eggs_folder,
+        "vanillapkg",
+        "1.0",
+        {"vanillapkg/mergeable.pt": VANILLA, "vanillapkg/conflicting.pt": VANILLA},
+    )
+    # the source folder of collective.patchwatcher
+    src = os.path.dirname(os.path.dirname(os.path.dirname(collective.patchwatcher.__file__)))
+    monkeypatch.setenv(
+        "PYTHONPATH", os.pathsep.join([site, src, os.environ.get("PYTHONPATH", "")])
+    )
+    args = ["--patchwatcher", "my_addon", "--patchwatcher-eggs", eggs_folder]
+    # the plugin is registered by its entry point, if collective.patchwatcher is installed
+    if not request.config.pluginmanager.has_plugin("patchwatcher"):
+        args += ["-p", "collective.patchwatcher.pytest_plugin"]
+    return lambda *extra: pytester.runpytest_subprocess(*(args + list(extra)))
+
+
+@unittest.skipIf(not SUPPORTED, "the plugin needs Python 3 and pytest >= 7")
+def test_collect_items(pytester, monkeypatch, request):
+    run = make_addon(pytester, monkeypatch, request)
+    result = run("--collect-only", "-q")
+    result.stdout.fnmatch_lines(
+        [
+            "*overrides_info.py::*mergeable.pt <- vanillapkg:mergeable.pt",
+            "*overrides_info.py::*conflicting.pt <- vanillapkg:conflicting.pt",
+            "*overrides_info.py::add in line 6",
+        ]
+    )
+
+
+@unittest.skipIf(not SUPPORTED, "the plugin needs Python 3 and pytest >= 7")
+def test_failure_shows_the_merge_diff(pytester, monkeypatch, request):
+    run = make_addon(pytester, monkeypatch, request)
+    result = run("-v")
+    result.assert_outcomes(passed=1, failed=2)
+    result.stdout.fnmatch_lines(
+        [
+            "*conflict: vanillapkg 1.0 -> 1.1 (1 conflicts)",
+            "+++ merge result",
+            "+<<<<<<< *",
+            "+upstream",
+            "*overrides_info.py:6: the arguments of the declaration are not literals*",
+        ]
+    )
+
+
+@unittest.skipIf(not SUPPORTED, "the plugin needs Python 3 and pytest >= 7")
+def test_unchanged_declarations_are_skipped(pytester, monkeypatch, request):
+    run = make_addon(pytester, monkeypatch, request)
+    run().assert_outcomes(passed=1, failed=2)
+    # the successfully checked declaration did not change since the last run
+    result = run("-rs")
+    result.assert_outcomes(skipped=1, failed=2)
+    result.stdout.fnmatch_lines(["*did not change since the last successful check*"])
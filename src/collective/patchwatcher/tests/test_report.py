@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""Tests for the HTML report."""
+from collective.patchwatcher.report import HtmlReport
+
+import base64
+import io
+import os
+import re
+import shutil
+import tempfile
+import unittest
+import zlib
+
+
+class DummyDistribution(object):
+    version = "1.2"
+
+
+class DummyDeclaration(object):
+    def __init__(self, path, status, diffs):
+        self.local_package = "my.package"
+        self.local_path = "./overrides/" + path
+        self.package = "demo.pkg"
+        self.path = path
+        self.version = "1.0"
+        self.distribution = DummyDistribution()
+        self.status = status
+        self.conflicts = 0
+        self.conflict_version = None
+        self.changed_version = None
+        self.diffs = diffs
+
+
+class TestHtmlReport(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def read(self, *path):
+        with io.open(os.path.join(self.directory, *path), encoding="utf8") as file:
+            return file.read()
+
+    def test_rows_are_written_immediately(self):
+        report = HtmlReport(self.directory)
+        report.add(DummyDeclaration("a.pt", "unchanged", {}))
+        self.assertIn(u"a.pt", self.read("index.html"))
+        report.add(DummyDeclaration("<b>.pt", "merged", {}))
+        index = self.read("index.html")
+        self.assertIn(u"&lt;b&gt;.pt", index)
+        self.assertNotIn(u"</html>", index)
+        report.close()
+        self.assertIn(u"2 declarations checked. merged: 1, unchanged: 1", self.read("index.html"))
+
+    def test_fragment_round_trip(self):
+        diff = u"--- a\n+++ b\n-\x1b[31mold\x1b[m\n+new ä\n"
+        report = HtmlReport(self.directory)
+        report.add(DummyDeclaration("a.pt", "merged", {"merge": diff, "old_current": u""}))
+        report.close()
+        self.assertEqual(os.listdir(os.path.join(self.directory, "fragments")), ["00001-merge.js"])
+        self.assertIn(u"patchwatcherToggle('00001-merge')", self.read("index.html"))
+        match = re.match(
+            r'patchwatcherFragment\("00001-merge", "([^"]*)"\);\n$',
+            self.read("fragments", "00001-merge.js"),
+        )
+        data = zlib.decompress(base64.b64decode(match.group(1))).decode("utf8")
+        self.assertEqual(data, u"--- a\n+++ b\n-old\n+new ä\n")